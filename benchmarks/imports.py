@@ -0,0 +1,99 @@
+"""
+Measure how long worker processes take to start and to fork a work horse.
+
+    make bench-imports
+    make bench-imports BENCH_ARGS="-n 20 medien_diff.worker"
+
+Every module is imported in a fresh interpreter, `-n` times. After the import,
+the process forks `--forks` times and each child imports the jobs, like an
+`rq worker` work horse does before running its job.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+ENTRY_POINTS = ["medien_diff", "medien_diff.worker", "medien_diff.web"]
+HEAVY_MODULES = {
+    "selenium",
+    "tweepy",
+    "flask_admin",
+    "flask_migrate",
+    "rq_dashboard",
+    "PIL",
+}
+
+
+def _measure(module, forks):
+    start = time.perf_counter()
+    importlib.import_module(module)
+    import_seconds = time.perf_counter() - start
+
+    loaded = {name.split(".")[0] for name in sys.modules}
+
+    fork_timings = []
+    for _ in range(forks):
+        start = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            importlib.import_module("medien_diff.tasks")
+            os._exit(0)
+        os.waitpid(pid, 0)
+        fork_timings.append(time.perf_counter() - start)
+
+    fork_timings.sort()
+    return {
+        "import_ms": 1000 * import_seconds,
+        "fork_p50_ms": 1000 * fork_timings[len(fork_timings) // 2],
+        "heavy_modules": sorted(loaded & HEAVY_MODULES),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("module", nargs="*")
+    parser.add_argument("-n", type=int, default=10)
+    parser.add_argument("--forks", type=int, default=10)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        (module,) = args.module
+        print(json.dumps(_measure(module, args.forks)))
+        return
+
+    for module in args.module or ENTRY_POINTS:
+        results = []
+        for _ in range(args.n):
+            output = subprocess.check_output(
+                [
+                    sys.executable,
+                    __file__,
+                    "--child",
+                    "--forks",
+                    str(args.forks),
+                    module,
+                ]
+            )
+            results.append(json.loads(output.decode("utf8").splitlines()[-1]))
+
+        import_ms = sorted(r["import_ms"] for r in results)
+        fork_ms = sorted(r["fork_p50_ms"] for r in results)
+        print(
+            "{:>20}: import mean {:8.2f}ms  min {:8.2f}ms  "
+            "fork+import jobs p50 {:8.2f}ms  heavy modules: {}".format(
+                module,
+                sum(import_ms) / len(import_ms),
+                import_ms[0],
+                fork_ms[len(fork_ms) // 2],
+                ", ".join(results[0]["heavy_modules"]) or "-",
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
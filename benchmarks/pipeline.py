@@ -0,0 +1,567 @@
+"""
+End-to-end benchmark of refreshing: refresh_all -> fetch_newspaper_frontpage
+-> fetch_newspaper_articles -> flush_article_results -> tweet, with nothing
+but local stubs.
+
+    make bench-pipeline
+    make bench-pipeline BENCH_ARGS="--papers 5 --articles 200 --rounds 3"
+    make bench-pipeline BENCH_ARGS="--json before.json"
+    make bench-pipeline BENCH_ARGS="--compare before.json"
+
+Frontpages and articles are served from a corpus directory by an HTTP server
+in a separate process, one port per newspaper. By default a synthetic corpus
+is generated, `--record DIR` captures a real one from the newspapers in the
+configured database (this talks to the live websites), `--corpus DIR` replays
+it.
+
+Redis is fakeredis unless `REDIS_URL` is set, the database is a fresh SQLite
+file unless `--db` is given. Tables in that database are dropped, only ever
+point it at a throwaway one. The Twitter API is replaced by a stub that
+counts calls, the diffs are still rendered.
+
+Jobs run in-process in a single worker, like `flask refresh` does. The
+first round starts from an empty database. Before each following round all
+articles are made due again and, for synthetic corpora, `--change-rate` of
+the titles change.
+"""
+
+import argparse
+import collections
+import datetime
+import email.utils
+import functools
+import http.server
+import json
+import logging
+import multiprocessing
+import os
+import random
+import re
+import resource
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+_WORDS = (
+    "Regierung Budget Wahl Minister Streit Einigung Gericht Urteil Polizei "
+    "Einsatz Unwetter Warnung Bahn Streik Schule Reform Klima Gipfel Virus "
+    "Impfung Wirtschaft Krise Bank Pleite Fußball Sieg Niederlage Trainer "
+    "Rücktritt Skandal Studie Forscher Hitze Preise steigen sinken plant "
+    "verschiebt fordert kritisiert beschließt verliert gewinnt warnt"
+).split()
+
+_STAGES = (
+    ("refresh_all", "refresh_all"),
+    ("frontpage", "fetch_newspaper_frontpage"),
+    ("article_batch", "fetch_newspaper_articles"),
+    ("article", "_fetch_article"),
+    ("flush", "flush_article_results"),
+    ("tweet", "tweet"),
+)
+
+
+# CORPUS
+#
+# DIR/manifest.json lists the newspapers, DIR/<slug>/<quoted path>.html are
+# the pages. Pages are served as they are, except that URLs pointing to the
+# newspaper's original host are pointed to the stub instead.
+
+
+def _page_file(corpus, slug, path):
+    return os.path.join(corpus, slug, urllib.parse.quote(path, safe="") + ".html")
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf8") as f:
+        f.write(text)
+
+
+def _title(rng):
+    return " ".join(rng.choice(_WORDS) for _ in range(rng.randint(5, 10)))
+
+
+def _synthetic_article(rng, title):
+    # Real articles come with a lot of markup before the headline
+    head = "<script>var config = {};</script>" * 500
+    body = "<p>{}</p>".format(" ".join(rng.choice(_WORDS) for _ in range(100))) * 80
+    return (
+        "<!DOCTYPE html><html><head><title>{title}</title>{head}</head><body>"
+        '<nav><a href="/">Home</a></nav><article><h1 class="headline">{title}</h1>'
+        "{body}</article></body></html>"
+    ).format(title=title, head=head, body=body)
+
+
+def _synthetic_frontpage(titles):
+    teasers = "".join(
+        '<div class="teaser"><a href="/story/{id}?ref=front"><img src="x.jpg"></a>'
+        '<a href="/story/{id}"><h2>{title}</h2></a></div>'.format(id=id, title=title)
+        for id, title in sorted(titles.items())
+    )
+    return (
+        "<!DOCTYPE html><html><body>"
+        '<a href="/impressum">Impressum</a>{}</body></html>'.format(teasers)
+    )
+
+
+def generate_corpus(corpus, papers, articles, seed):
+    """
+    Write a synthetic corpus, returns the titles as
+    `{slug: {article_id: title}}`.
+    """
+
+    rng = random.Random(seed)
+    manifest = []
+    titles = {}
+
+    for i in range(papers):
+        slug = "paper{}".format(i)
+        manifest.append(
+            {
+                "slug": slug,
+                "name": "Paper {}".format(i),
+                "origin": None,
+                "base_path": "/",
+                "article_url_pattern": r"^{origin}/story/\d+$",
+                "article_title_css_selector": "h1.headline",
+                "teaser_title_css_selector": "h2",
+            }
+        )
+        titles[slug] = {j: _title(rng) for j in range(articles)}
+        for j, title in titles[slug].items():
+            _write(
+                _page_file(corpus, slug, "/story/{}".format(j)),
+                _synthetic_article(rng, title),
+            )
+        _write(_page_file(corpus, slug, "/"), _synthetic_frontpage(titles[slug]))
+
+    _write(os.path.join(corpus, "manifest.json"), json.dumps(manifest, indent=2))
+    return titles
+
+
+def change_titles(corpus, titles, rate, seed):
+    """
+    Give `rate` of the synthetic articles a new title, on the article page as
+    well as on the frontpage. Returns the number of changed titles.
+    """
+
+    rng = random.Random(seed)
+    changed = 0
+
+    for slug, paper_titles in titles.items():
+        for j in list(paper_titles):
+            if rng.random() < rate:
+                paper_titles[j] = _title(rng)
+                _write(
+                    _page_file(corpus, slug, "/story/{}".format(j)),
+                    _synthetic_article(rng, paper_titles[j]),
+                )
+                changed += 1
+        _write(_page_file(corpus, slug, "/"), _synthetic_frontpage(paper_titles))
+
+    return changed
+
+
+def record_corpus(corpus, articles):
+    """
+    Download the frontpages and up to `articles` articles per newspaper in the
+    configured database.
+    """
+
+    from medien_diff import app
+    from medien_diff.models import db, Newspaper
+    from medien_diff.profiles import NewspaperProfile
+    from medien_diff.http_utils import http_session
+    from medien_diff.tasks import _article_links
+
+    manifest = []
+
+    with app.app_context():
+        for paper in db.session.query(Newspaper).order_by(Newspaper.id):
+            profile = NewspaperProfile(paper)
+            base_url = urllib.parse.urlsplit(paper.base_url)
+            origin = "{}://{}".format(base_url.scheme, base_url.netloc)
+            slug = re.sub(r"[^a-z0-9]+", "-", paper.name.lower()).strip("-")
+
+            response = http_session.get(paper.base_url)
+            response.raise_for_status()
+            _write(_page_file(corpus, slug, base_url.path or "/"), response.text)
+
+            urls = [
+                url
+                for url in _article_links(profile, response)
+                if url.startswith(origin + "/")
+            ][:articles]
+            for url in urls:
+                article = http_session.get(url)
+                if article.ok:
+                    path = urllib.parse.urlsplit(url).path
+                    _write(_page_file(corpus, slug, path), article.text)
+
+            print("{}: {} articles".format(paper.name, len(urls)), file=sys.stderr)
+            manifest.append(
+                {
+                    "slug": slug,
+                    "name": paper.name,
+                    "origin": origin,
+                    "base_path": base_url.path or "/",
+                    "article_url_pattern": paper.article_url_pattern,
+                    "article_title_css_selector": paper.article_title_css_selector,
+                    "teaser_title_css_selector": paper.teaser_title_css_selector,
+                }
+            )
+
+    _write(os.path.join(corpus, "manifest.json"), json.dumps(manifest, indent=2))
+
+
+# HTTP STUB
+
+
+class _StubServer(http.server.ThreadingHTTPServer):
+    # The default backlog of 5 makes concurrent fetches wait for SYN retries
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        # Articles are streamed and abandoned as soon as the title is found
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def _serve(corpus, manifest, ports, requests):
+    servers = []
+
+    for paper in manifest:
+        server = _StubServer(("127.0.0.1", 0), _stub_handler(corpus, paper, requests))
+        servers.append(server)
+
+    # Pages need to know every stub's address before anything is served
+    for paper, server in zip(manifest, servers):
+        paper["local"] = "127.0.0.1:{}".format(server.server_port)
+    for paper, server in zip(manifest, servers):
+        ports.put(server.server_port)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    threading.Event().wait()
+
+
+def _stub_handler(corpus, paper, requests):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            with requests.get_lock():
+                requests.value += 1
+
+            path = urllib.parse.urlsplit(self.path).path
+            try:
+                stat = os.stat(_page_file(corpus, paper["slug"], path))
+            except FileNotFoundError:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            etag = '"{:x}-{:x}"'.format(stat.st_mtime_ns, stat.st_size)
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+
+            with open(_page_file(corpus, paper["slug"], path), "rb") as f:
+                body = f.read()
+            if paper["origin"]:
+                host = urllib.parse.urlsplit(paper["origin"]).netloc
+                body = body.replace(
+                    b"https://" + host.encode(), b"http://" + host.encode()
+                ).replace(b"//" + host.encode(), b"//" + paper["local"].encode())
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.send_header(
+                "Last-Modified", email.utils.formatdate(stat.st_mtime, usegmt=True)
+            )
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+def _local_pattern(paper):
+    local = "http://" + paper["local"]
+    pattern = paper["article_url_pattern"]
+    if paper["origin"] is None:
+        return pattern.replace("{origin}", re.escape(local))
+
+    # Match the host however much of it is escaped in the pattern
+    host = urllib.parse.urlsplit(paper["origin"]).netloc
+    host_regex = "".join(r"\\?" + re.escape(c) for c in host)
+    local_pattern = re.sub(host_regex, lambda _: re.escape(paper["local"]), pattern)
+    if local_pattern == pattern:
+        raise ValueError(
+            "Can't point article_url_pattern of {} to the stub: {}".format(
+                paper["name"], pattern
+            )
+        )
+
+    return local_pattern.replace("https", "http")
+
+
+# MEASURING
+
+
+class _FakeTwitterAPI(object):
+    calls = collections.Counter()
+
+    def __init__(self, auth=None, **kwargs):
+        pass
+
+    def media_upload(self, filename, file=None, **kwargs):
+        self.calls["media_upload"] += 1
+        file.read()
+        return argparse.Namespace(media_id_string="1")
+
+    def update_status(self, status, media_ids=None, **kwargs):
+        self.calls["update_status"] += 1
+
+
+def _timed(stage, timings, failures, f):
+    @functools.wraps(f)
+    def inner(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return f(*args, **kwargs)
+        except Exception:
+            failures[stage] += 1
+            raise
+        finally:
+            timings[stage].append(time.perf_counter() - start)
+
+    return inner
+
+
+def _percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+def _summarize(timings, failures):
+    stages = {}
+    for stage, _ in _STAGES:
+        values = sorted(timings.get(stage, ()))
+        if not values:
+            continue
+        stages[stage] = {
+            "count": len(values),
+            "failed": failures.get(stage, 0),
+            "per_s": len(values) / sum(values) if sum(values) else 0,
+            "p50_ms": 1000 * _percentile(values, 0.5),
+            "p95_ms": 1000 * _percentile(values, 0.95),
+            "p99_ms": 1000 * _percentile(values, 0.99),
+            "max_ms": 1000 * values[-1],
+        }
+    return stages
+
+
+def run(args, corpus, titles):
+    with open(os.path.join(corpus, "manifest.json")) as f:
+        manifest = json.load(f)
+
+    ports = multiprocessing.Queue()
+    requests = multiprocessing.Value("L", 0)
+    stub = multiprocessing.Process(
+        target=_serve, args=(corpus, manifest, ports, requests), daemon=True
+    )
+    stub.start()
+    for paper in manifest:
+        paper["local"] = "127.0.0.1:{}".format(ports.get())
+
+    db_file = os.path.join(corpus, "bench.sqlite")
+    os.environ["SQLALCHEMY_DATABASE_URI"] = args.db or "sqlite:///" + db_file
+    os.environ.setdefault("FLASK_SECRET_KEY", "bench")
+    os.environ["SENTRY_DSN"] = ""
+    os.environ["DIFF_RENDERER"] = args.renderer
+    # Tweet right away instead of waiting for further changes
+    os.environ["TWEET_COALESCE_SECONDS"] = "0"
+
+    if "REDIS_URL" not in os.environ:
+        import fakeredis
+        import redis
+
+        server = fakeredis.FakeServer()
+        redis.Redis.from_url = staticmethod(
+            lambda *a, **kw: fakeredis.FakeRedis(server=server)
+        )
+
+    import tweepy
+
+    logging.getLogger("rq.worker").setLevel(logging.WARNING)
+
+    from medien_diff import app, QUEUES, redis_conn, worker_queues
+    from medien_diff.worker import RoundRobinSimpleWorker
+    from medien_diff.models import db, Newspaper, ArticleRevision
+    import medien_diff.tasks as tasks
+
+    tweepy.API = _FakeTwitterAPI
+    timings = collections.defaultdict(list)
+    failures = collections.Counter()
+    for stage, name in _STAGES:
+        setattr(tasks, name, _timed(stage, timings, failures, getattr(tasks, name)))
+
+    redis_conn.flushdb()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        for paper in manifest:
+            db.session.add(
+                Newspaper(
+                    name=paper["name"],
+                    base_url="http://{}{}".format(paper["local"], paper["base_path"]),
+                    article_url_pattern=_local_pattern(paper),
+                    article_title_css_selector=paper["article_title_css_selector"],
+                    teaser_title_css_selector=(
+                        paper["teaser_title_css_selector"] if args.teasers else None
+                    ),
+                    twitter_consumer_key="bench",
+                    twitter_consumer_secret="bench",
+                    twitter_access_token_key="bench",
+                    twitter_access_token_secret="bench",
+                )
+            )
+        db.session.commit()
+
+    worker = RoundRobinSimpleWorker(
+        worker_queues() + [QUEUES["twitter"]], connection=redis_conn
+    )
+    rounds = []
+
+    for round_no in range(args.rounds):
+        changed = 0
+        if round_no > 0:
+            if titles is not None:
+                changed = change_titles(
+                    corpus, titles, args.change_rate, args.seed + round_no
+                )
+            with app.app_context():
+                db.session.query(ArticleRevision).update(
+                    {ArticleRevision.next_fetch_at: datetime.datetime.now()}
+                )
+                db.session.commit()
+
+        timings.clear()
+        failures.clear()
+        _FakeTwitterAPI.calls.clear()
+        requests_before = requests.value
+
+        start = time.perf_counter()
+        QUEUES["main"].enqueue(tasks.refresh_all)
+        worker.work(burst=True)
+        while tasks.flush_article_results():
+            worker.work(burst=True)
+        wall = time.perf_counter() - start
+
+        with app.app_context():
+            article_count = db.session.query(ArticleRevision).count()
+
+        rounds.append(
+            {
+                "round": round_no + 1,
+                "wall_s": wall,
+                "http_requests": requests.value - requests_before,
+                "articles_fetched": len(timings["article"]),
+                "articles_per_s": len(timings["article"]) / wall,
+                "titles_changed": changed,
+                "tweets": _FakeTwitterAPI.calls["update_status"],
+                "articles_in_db": article_count,
+                "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                "stages": _summarize(timings, failures),
+            }
+        )
+
+    stub.terminate()
+    return rounds
+
+
+# REPORTING
+
+
+def report(rounds, baseline=None):
+    for r in rounds:
+        print(
+            "round {round}: {wall_s:.2f}s, {articles_fetched} articles fetched "
+            "({articles_per_s:.1f}/s), {http_requests} requests, "
+            "{titles_changed} titles changed, {tweets} tweets, "
+            "{articles_in_db} articles in db, rss {max_rss_kb}kB".format(**r)
+        )
+        base_stages = {}
+        if baseline is not None and r["round"] <= len(baseline):
+            base_stages = baseline[r["round"] - 1]["stages"]
+
+        for stage, s in r["stages"].items():
+            line = (
+                "  {stage:>13}: {count:6d} ({failed} failed) {per_s:8.1f}/s  "
+                "p50 {p50_ms:8.2f}ms  p95 {p95_ms:8.2f}ms  p99 {p99_ms:8.2f}ms  "
+                "max {max_ms:8.2f}ms".format(stage=stage, **s)
+            )
+            base = base_stages.get(stage)
+            if base:
+                line += "  p50 {:+.0%}  p95 {:+.0%}".format(
+                    s["p50_ms"] / base["p50_ms"] - 1, s["p95_ms"] / base["p95_ms"] - 1
+                )
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--papers", type=int, default=3)
+    parser.add_argument("--articles", type=int, default=100, help="per newspaper")
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--change-rate", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--teasers", action="store_true", help="use teaser titles on frontpages"
+    )
+    parser.add_argument("--renderer", choices=["selenium", "pillow"], default="pillow")
+    parser.add_argument("--db", help="SQLAlchemy URI of a throwaway database")
+    parser.add_argument("--corpus", help="replay a recorded corpus")
+    parser.add_argument("--record", metavar="DIR", help="record a corpus and exit")
+    parser.add_argument("--json", help="also write results to this file")
+    parser.add_argument("--compare", help="results of an earlier --json run")
+    args = parser.parse_args()
+
+    if args.record:
+        record_corpus(args.record, args.articles)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        titles = None
+        corpus = args.corpus
+        if corpus is None:
+            corpus = tmp
+            titles = generate_corpus(corpus, args.papers, args.articles, args.seed)
+        elif not args.db:
+            # Don't write into the recorded corpus
+            args.db = "sqlite:///" + os.path.join(tmp, "bench.sqlite")
+
+        rounds = run(args, corpus, titles)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["rounds"]
+
+    report(rounds, baseline)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "rounds": rounds}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Compare the latency and memory of the diff renderers.
+
+    make bench-render
+    make bench-render BENCH_ARGS="--backend pillow -n 200"
+
+Each backend is measured in its own subprocess so that peak RSS numbers don't
+influence each other. Chrome runs in child processes, their peak RSS is
+reported separately.
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+SAMPLES = [
+    ("Regierung plant neue Steuer", "Regierung verwirft neue Steuer"),
+    (
+        "Bürgermeister tritt nach Korruptionsvorwürfen zurück",
+        "Bürgermeister weist Korruptionsvorwürfe zurück, Opposition fordert Rücktritt",
+    ),
+    (
+        "Live: Nationalrat debattiert über das Budget für das kommende Jahr",
+        "Nationalrat beschließt Budget für das kommende Jahr nach langer Debatte",
+    ),
+]
+
+
+def _measure(backend, n):
+    from medien_diff import app
+    from medien_diff.render import render_diff
+
+    app.config["DIFF_RENDERER"] = backend
+    timings = []
+
+    with app.app_context():
+        # Warm up, this also starts the browser
+        render_diff(*SAMPLES[0])
+
+        for i in range(n):
+            old, new = SAMPLES[i % len(SAMPLES)]
+            start = time.perf_counter()
+            render_diff(old, new)
+            timings.append(time.perf_counter() - start)
+
+        if backend == "selenium":
+            from medien_diff.browser import get_browser_pool
+
+            get_browser_pool().close()
+
+    timings.sort()
+    return {
+        "backend": backend,
+        "renders": n,
+        "mean_ms": 1000 * sum(timings) / n,
+        "p50_ms": 1000 * timings[n // 2],
+        "p95_ms": 1000 * timings[min(n - 1, int(n * 0.95))],
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "children_max_rss_kb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--backend", action="append", choices=["selenium", "pillow"], default=[]
+    )
+    parser.add_argument("-n", type=int, default=50)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        (backend,) = args.backend
+        print(json.dumps(_measure(backend, args.n)))
+        return
+
+    for backend in args.backend or ["selenium", "pillow"]:
+        output = subprocess.check_output(
+            [
+                sys.executable,
+                __file__,
+                "--child",
+                "--backend",
+                backend,
+                "-n",
+                str(args.n),
+            ]
+        )
+        result = json.loads(output.decode("utf8").splitlines()[-1])
+        print(
+            "{backend:>10}: mean {mean_ms:8.2f}ms  p50 {p50_ms:8.2f}ms  "
+            "p95 {p95_ms:8.2f}ms  rss {max_rss_kb}kB  "
+            "children rss {children_max_rss_kb}kB".format(**result)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,21 @@
 import os
 
-import tweepy
-import rq
 import sentry_sdk
 from sentry_sdk.integrations.redis import RedisIntegration
 from sentry_sdk.integrations.pure_eval import PureEvalIntegration
-import click
 import flask
-import flask_admin
-import flask_admin.contrib.sqla
-from sqlalchemy import Index
-from sqlalchemy.exc import ProgrammingError
 from redis import Redis
 from rq import Queue
 
-from medien_diff.models import init_db, Newspaper, ArticleRevision
-
+from medien_diff.models import init_db
 
 app = flask.Flask(__name__)
 app.config["SECRET_KEY"] = os.environ["FLASK_SECRET_KEY"]
 
 sentry_sdk.init(
     _experiments={"auto_enabling_integrations": True},
-    traces_sample_rate=1.0,
+    # Per-stage timings are in /metrics, tracing every job is expensive
+    traces_sample_rate=float(os.environ.get("SENTRY_TRACES_SAMPLE_RATE", "0.01")),
     environment=app.env,
     in_app_include=["medien_diff"],
     integrations=[PureEvalIntegration(), RedisIntegration()],
@@ -34,15 +27,80 @@ app.config["SQLALCHEMY_DATABASE_URI"] = os.environ["SQLALCHEMY_DATABASE_URI"]
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 db = init_db(app)
 
-# XXX: Honor envvar
-redis_conn = Redis()
+# Also picked up by `rq worker -c medien_diff.worker`
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+redis_conn = Redis.from_url(REDIS_URL)
+
+# HTTP
+# Number of hosts to keep connections to, and connections kept per host
+app.config["HTTP_POOL_CONNECTIONS"] = int(os.environ.get("HTTP_POOL_CONNECTIONS", "50"))
+app.config["HTTP_POOL_MAXSIZE"] = int(os.environ.get("HTTP_POOL_MAXSIZE", "10"))
+# Seconds to wait for a connection, and for each read from it
+app.config["HTTP_CONNECT_TIMEOUT"] = float(os.environ.get("HTTP_CONNECT_TIMEOUT", "10"))
+app.config["HTTP_READ_TIMEOUT"] = float(os.environ.get("HTTP_READ_TIMEOUT", "30"))
+# After this many failed requests to a newspaper in a row, its jobs are
+# dropped for that many seconds, see medien_diff.circuit
+app.config["CIRCUIT_FAILURE_THRESHOLD"] = int(
+    os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "10")
+)
+app.config["CIRCUIT_COOLDOWN"] = int(os.environ.get("CIRCUIT_COOLDOWN", "600"))
+
+# Articles are fetched in batches of this size, with that many requests in
+# flight at once. See fetch_newspaper_articles.
+app.config["ARTICLE_FETCH_BATCH_SIZE"] = int(
+    os.environ.get("ARTICLE_FETCH_BATCH_SIZE", "50")
+)
+app.config["ARTICLE_FETCH_CONCURRENCY"] = int(
+    os.environ.get("ARTICLE_FETCH_CONCURRENCY", "10")
+)
+
+# Article results are written to the DB in batches, see medien_diff.persistence
+app.config["ARTICLE_BATCH_SIZE"] = int(os.environ.get("ARTICLE_BATCH_SIZE", "100"))
+# Max. seconds a result waits for its batch to fill up
+app.config["ARTICLE_FLUSH_INTERVAL"] = int(
+    os.environ.get("ARTICLE_FLUSH_INTERVAL", "10")
+)
+
+# RENDERING
+app.config["BROWSER_POOL_SIZE"] = int(os.environ.get("BROWSER_POOL_SIZE", "1"))
+app.config["BROWSER_MAX_RENDERS"] = int(os.environ.get("BROWSER_MAX_RENDERS", "100"))
+# "selenium" or "pillow"
+app.config["DIFF_RENDERER"] = os.environ.get("DIFF_RENDERER", "selenium")
+
+# TWITTER
+# Changes are only tweeted once within that many days, see medien_diff.debounce
+app.config["TWEET_DEBOUNCE_DAYS"] = int(os.environ.get("TWEET_DEBOUNCE_DAYS", "30"))
+# Changes to an article within that many seconds go into one tweet
+app.config["TWEET_COALESCE_SECONDS"] = int(
+    os.environ.get("TWEET_COALESCE_SECONDS", "600")
+)
+# Tweets per account and window (in seconds), see medien_diff.tweets
+app.config["TWEET_RATE_LIMIT"] = int(os.environ.get("TWEET_RATE_LIMIT", "300"))
+app.config["TWEET_RATE_LIMIT_WINDOW"] = int(
+    os.environ.get("TWEET_RATE_LIMIT_WINDOW", str(3 * 60 * 60))
+)
+
+# QUEUES
+# Number of shards of the main and slow queues, see shard_queue
+app.config["QUEUE_SHARDS"] = int(os.environ.get("QUEUE_SHARDS", "1"))
 
 
 class ResultlessQueue(Queue):
     def enqueue(*args, **kwargs):
         kwargs.setdefault("result_ttl", 0)
         kwargs.setdefault("failure_ttl", 0)
-        Queue.enqueue(*args, **kwargs)
+        return Queue.enqueue(*args, **kwargs)
+
+    def enqueue_at(*args, **kwargs):
+        kwargs.setdefault("result_ttl", 0)
+        kwargs.setdefault("failure_ttl", 0)
+        return Queue.enqueue_at(*args, **kwargs)
+
+    @staticmethod
+    def prepare_data(*args, **kwargs):
+        kwargs.setdefault("result_ttl", 0)
+        kwargs.setdefault("failure_ttl", 0)
+        return Queue.prepare_data(*args, **kwargs)
 
 
 QUEUES = {
@@ -53,70 +111,55 @@ QUEUES = {
 
 redis_queue_main = QUEUES["main"]
 
-# VIEWS
-class ModelView(flask_admin.contrib.sqla.ModelView):
-    def __init__(self, model, *args, with_primary_key=False, **kwargs):
-        if with_primary_key:
-            self.column_list = [c.key for c in model.__table__.columns]
-            self.form_columns = self.column_list
 
-        for field in "form_create_rules", "form_edit_rules":
-            if hasattr(model, field):
-                setattr(self, field, getattr(model, field))
+def _shards(name):
+    if app.config["QUEUE_SHARDS"] == 1:
+        return [QUEUES[name]]
 
-        super(ModelView, self).__init__(model, *args, **kwargs)
+    return [
+        ResultlessQueue("medien_diff_{}_{}".format(name, shard), connection=redis_conn)
+        for shard in range(app.config["QUEUE_SHARDS"])
+    ]
 
 
-admin = flask_admin.Admin(app)
-admin.add_view(ModelView(Newspaper, db.session))
-admin.add_view(ModelView(ArticleRevision, db.session, with_primary_key=True))
-
-import rq_dashboard.web
-
-app.register_blueprint(rq_dashboard.web.blueprint, url_prefix="/queues")
-
-
-@app.route("/")
-def index():
-    return flask.render_template("index.html")
+SHARDS = {"main": _shards("main"), "slow": _shards("slow")}
 
+# Every queue by a short name, e.g. "main" or "slow_3"
+ALL_QUEUES = dict(
+    QUEUES,
+    **{
+        queue.name[len("medien_diff_") :]: queue
+        for shards in SHARDS.values()
+        for queue in shards
+    }
+)
 
-@app.cli.command()
-@click.option("--run-worker/--no-run-worker", default=True)
-def refresh(run_worker):
-    from medien_diff.tasks import refresh_all
 
-    redis_queue_main.enqueue(refresh_all)
+def shard_queue(name, newspaper_id):
+    """
+    Return the shard of the main or slow queue that jobs of `newspaper_id`
+    go to. With at least as many shards as newspapers, each one gets its own.
+    """
 
-    if run_worker:
-        worker = rq.SimpleWorker(list(QUEUES.values()), connection=redis_conn)
-        worker.work(burst=True)
+    shards = SHARDS[name]
+    return shards[newspaper_id % len(shards)]
 
 
-@app.cli.command()
-def twitter():
-    paper = db.session.query(Newspaper).get(int(click.prompt("ID of newspaper")))
-    if (
-        paper.twitter_consumer_key
-        or paper.twitter_consumer_secret
-        or paper.twitter_access_token_key
-        or paper.twitter_access_token_secret
-    ):
-        click.echo("Credentials already exist, clear them out first!")
-        click.exit(1)
+def worker_queues(shards=None):
+    """
+    Return the queues a fetching worker consumes: the main queue for
+    housekeeping jobs, then the main and slow queue shards numbered `shards`
+    (all by default).
+    """
 
-    consumer_key = click.prompt("Consumer key")
-    consumer_secret = click.prompt("Consumer secret")
+    queues = [QUEUES["main"]]
+    for name in "main", "slow":
+        for shard, queue in enumerate(SHARDS[name]):
+            if (shards is None or shard in shards) and queue not in queues:
+                queues.append(queue)
 
-    auth = tweepy.OAuthHandler(consumer_key, consumer_secret)
+    return queues
 
-    click.echo("Go to {}".format(auth.get_authorization_url()))
 
-    access_token_key, access_token_secret = auth.get_access_token(
-        click.prompt("Verification code")
-    )
-    paper.twitter_consumer_key = consumer_key
-    paper.twitter_consumer_secret = consumer_secret
-    paper.twitter_access_token_key = access_token_key
-    paper.twitter_access_token_secret = access_token_secret
-    db.session.commit()
+# Registers the cache invalidation hooks for admin edits
+import medien_diff.profiles
@@ -0,0 +1,130 @@
+import atexit
+import contextlib
+import logging
+import queue
+import threading
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+
+logger = logging.Logger(__name__)
+
+
+def _start_chrome():
+    chrome_options = Options()
+    chrome_options.add_argument("--headless")
+    return webdriver.Chrome(chrome_options=chrome_options)
+
+
+class _PooledBrowser(object):
+    def __init__(self, driver):
+        self.driver = driver
+        self.renders = 0
+
+
+class BrowserPool(object):
+    """
+    A bounded pool of warm headless browsers. Browsers are health-checked when
+    checked out and replaced after `max_renders` uses, so a leaking Chrome
+    doesn't live forever.
+    """
+
+    def __init__(self, size=1, max_renders=100, factory=_start_chrome):
+        self.max_renders = max_renders
+        self._factory = factory
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.LifoQueue()
+        self._closed = False
+
+    @contextlib.contextmanager
+    def browser(self):
+        with self._slots:
+            if self._closed:
+                raise RuntimeError("browser pool is closed")
+
+            browser = self._checkout()
+            try:
+                yield browser.driver
+            except Exception:
+                # The browser might be in any state now
+                self._quit(browser)
+                raise
+
+            browser.renders += 1
+            if self._closed or browser.renders >= self.max_renders:
+                self._quit(browser)
+            else:
+                self._idle.put(browser)
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                browser = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._quit(browser)
+
+    def _checkout(self):
+        while True:
+            try:
+                browser = self._idle.get_nowait()
+            except queue.Empty:
+                return _PooledBrowser(self._factory())
+
+            if self._is_healthy(browser):
+                return browser
+
+            self._quit(browser)
+
+    def _is_healthy(self, browser):
+        try:
+            return browser.driver.execute_script("return 1") == 1
+        except Exception:
+            logger.warning("browser.unhealthy", exc_info=True)
+            return False
+
+    def _quit(self, browser):
+        try:
+            browser.driver.quit()
+        except Exception:
+            logger.warning("browser.quit_failed", exc_info=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool():
+    """
+    Return the pool shared by all jobs in this worker process. It only lives as
+    long as the process, so run the twitter worker with `rq.SimpleWorker`.
+    """
+
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            from medien_diff import app
+
+            _pool = BrowserPool(
+                size=app.config["BROWSER_POOL_SIZE"],
+                max_renders=app.config["BROWSER_MAX_RENDERS"],
+            )
+            atexit.register(_pool.close)
+
+        return _pool
+
+
+def close_browser_pool():
+    """
+    Quit this process' browsers now, for processes that exit without running
+    `atexit` handlers.
+    """
+
+    global _pool
+
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
@@ -0,0 +1,99 @@
+"""
+A circuit breaker per newspaper. Once a site failed `CIRCUIT_FAILURE_THRESHOLD`
+requests in a row, its circuit is open: all jobs for it are dropped instead of
+timing out one by one and reporting to Sentry. After `CIRCUIT_COOLDOWN`
+seconds a single probe request is let through, which closes the circuit again
+if it succeeds.
+"""
+
+import logging
+
+from medien_diff import app, redis_conn
+from medien_diff import metrics
+
+logger = logging.Logger(__name__)
+
+# Failure counts of sites that recovered before anything was fetched from them
+# again are forgotten after that long
+_FAILURES_TTL = 60 * 60 * 24
+
+
+def _key(kind, newspaper_id):
+    return "medien_diff:circuit:{}:{}".format(kind, newspaper_id)
+
+
+def is_failure(response):
+    """
+    Whether `response` means that the whole site is in trouble, rather than
+    just this page.
+    """
+
+    return response.status_code in (403, 429) or response.status_code >= 500
+
+
+def allow(newspaper_id):
+    """
+    Return whether a job may send a request to the newspaper's site.
+    """
+
+    pipe = redis_conn.pipeline(transaction=False)
+    pipe.exists(_key("open", newspaper_id))
+    pipe.get(_key("failures", newspaper_id))
+    is_open, failures = pipe.execute()
+
+    if is_open:
+        return False
+    if int(failures or 0) < app.config["CIRCUIT_FAILURE_THRESHOLD"]:
+        return True
+
+    # The cooldown is over, only one job gets to probe the site
+    return bool(
+        redis_conn.set(
+            _key("probe", newspaper_id),
+            b"1",
+            nx=True,
+            ex=app.config["CIRCUIT_COOLDOWN"],
+        )
+    )
+
+
+def open_circuits(newspaper_ids):
+    """
+    Return those of `newspaper_ids` whose circuit is open.
+    """
+
+    newspaper_ids = list(newspaper_ids)
+    pipe = redis_conn.pipeline(transaction=False)
+    for newspaper_id in newspaper_ids:
+        pipe.exists(_key("open", newspaper_id))
+
+    return {
+        newspaper_id
+        for newspaper_id, is_open in zip(newspaper_ids, pipe.execute())
+        if is_open
+    }
+
+
+def record_success(newspaper_id):
+    redis_conn.delete(_key("failures", newspaper_id), _key("probe", newspaper_id))
+
+
+def record_failure(newspaper_id):
+    key = _key("failures", newspaper_id)
+    pipe = redis_conn.pipeline(transaction=False)
+    pipe.incr(key)
+    pipe.expire(key, _FAILURES_TTL)
+    failures, _ = pipe.execute()
+
+    threshold = app.config["CIRCUIT_FAILURE_THRESHOLD"]
+    if failures < threshold:
+        return
+
+    pipe = redis_conn.pipeline(transaction=False)
+    pipe.set(_key("open", newspaper_id), b"1", ex=app.config["CIRCUIT_COOLDOWN"])
+    pipe.delete(_key("probe", newspaper_id))
+    pipe.execute()
+
+    if failures == threshold:
+        logger.warning("circuit.opened", extra={"newspaper_id": newspaper_id})
+        metrics.incr("circuits_opened")
@@ -0,0 +1,194 @@
+"""
+Deletes articles that are due but would only be thrown away after fetching
+them: those whose URL no longer matches their newspaper's
+`article_url_pattern`, and those of deleted newspapers.
+"""
+
+import re
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+import sqlalchemy
+import sqlalchemy.exc
+
+from medien_diff.models import db, Newspaper, ArticleRevision, UrlAlias
+from medien_diff import metrics
+
+# Rows deleted per statement and transaction, to keep locks short
+_BATCH_SIZE = 1000
+
+# What may appear in a pattern matched by Postgres: these mean the same there
+# as in Python, at least for URLs. Anything else, like `\b` (a backspace to
+# Postgres), lookarounds or flags, has the pattern matched in Python instead.
+_PORTABLE_ESCAPES = "dDsSwW"
+_PORTABLE_CATEGORIES = {
+    sre_constants.CATEGORY_DIGIT,
+    sre_constants.CATEGORY_NOT_DIGIT,
+    sre_constants.CATEGORY_SPACE,
+    sre_constants.CATEGORY_NOT_SPACE,
+    sre_constants.CATEGORY_WORD,
+    sre_constants.CATEGORY_NOT_WORD,
+}
+_PORTABLE_ANCHORS = {sre_constants.AT_BEGINNING, sre_constants.AT_END}
+
+
+def delete_stale_articles(now):
+    """
+    Delete articles due at `now` that don't match their newspaper's pattern or
+    don't belong to any newspaper.
+    """
+
+    patterns = dict(db.session.query(Newspaper.id, Newspaper.article_url_pattern))
+    due = ArticleRevision.next_fetch_at <= now
+
+    orphaned = ArticleRevision.newspaper.is_(None)
+    if patterns:
+        orphaned = sqlalchemy.or_(
+            orphaned, ArticleRevision.newspaper.notin_(list(patterns))
+        )
+    deleted = _delete_batched(sqlalchemy.and_(due, orphaned))
+    metrics.incr("articles_deleted", deleted, reason="orphaned")
+
+    for newspaper_id, pattern in patterns.items():
+        of_paper = sqlalchemy.and_(due, ArticleRevision.newspaper == newspaper_id)
+        # Python's re.match only matches at the start
+        anchored = "^(?:{})".format(pattern)
+        if _is_portable_regex(pattern) and _is_postgres_regex(anchored):
+            deleted = _delete_batched(
+                sqlalchemy.and_(of_paper, ArticleRevision.url.op("!~")(anchored))
+            )
+        else:
+            deleted = _delete_nonmatching(of_paper, pattern)
+        metrics.incr("articles_deleted", deleted, reason="no_match")
+
+
+def _delete_batched(condition):
+    deleted = 0
+
+    while True:
+        urls = [
+            url
+            for url, in db.session.query(ArticleRevision.url)
+            .filter(condition)
+            .limit(_BATCH_SIZE)
+        ]
+        _delete_urls(urls)
+        deleted += len(urls)
+
+        if len(urls) < _BATCH_SIZE:
+            return deleted
+
+
+def _delete_nonmatching(condition, pattern):
+    # Without Postgres, the pattern has to be matched here
+    pattern = re.compile(pattern)
+    urls = [
+        url
+        for url, in db.session.query(ArticleRevision.url)
+        .filter(condition)
+        .yield_per(_BATCH_SIZE)
+        if not pattern.match(url)
+    ]
+
+    for start in range(0, len(urls), _BATCH_SIZE):
+        _delete_urls(urls[start : start + _BATCH_SIZE])
+
+    return len(urls)
+
+
+def _delete_urls(urls):
+    if urls:
+        db.session.query(ArticleRevision).filter(ArticleRevision.url.in_(urls)).delete(
+            synchronize_session=False
+        )
+        db.session.query(UrlAlias).filter(UrlAlias.canonical_url.in_(urls)).delete(
+            synchronize_session=False
+        )
+    db.session.commit()
+
+
+def _is_portable_regex(pattern):
+    """
+    Whether `pattern` only uses constructs that Postgres matches like Python.
+    """
+
+    # Postgres reads escapes like `\x41B` differently, and `[[:digit:]]` as
+    # a character class
+    escapes = re.findall(r"\\(.)", pattern, re.DOTALL)
+    if any(c.isalnum() and c not in _PORTABLE_ESCAPES for c in escapes):
+        return False
+    if re.search(r"\[[:.=]", pattern):
+        return False
+
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error:
+        return False
+
+    # `state` before Python 3.8
+    state = getattr(parsed, "state", None) or parsed.pattern
+    if state.flags & ~sre_constants.SRE_FLAG_UNICODE:
+        return False
+
+    return _is_portable_subpattern(parsed)
+
+
+def _is_portable_subpattern(subpattern):
+    for op, av in subpattern:
+        if op in (sre_constants.LITERAL, sre_constants.NOT_LITERAL):
+            # Unless a quantifier, `{` is a literal to Python and an error or
+            # a quantifier to Postgres
+            if av in (ord("{"), ord("}")):
+                return False
+        elif op == sre_constants.ANY:
+            pass
+        elif op == sre_constants.IN:
+            for item_op, item_av in av:
+                if item_op == sre_constants.CATEGORY:
+                    if item_av not in _PORTABLE_CATEGORIES:
+                        return False
+                elif item_op not in (
+                    sre_constants.LITERAL,
+                    sre_constants.RANGE,
+                    sre_constants.NEGATE,
+                ):
+                    return False
+        elif op == sre_constants.AT:
+            if av not in _PORTABLE_ANCHORS:
+                return False
+        elif op == sre_constants.BRANCH:
+            if not all(_is_portable_subpattern(branch) for branch in av[1]):
+                return False
+        elif op == sre_constants.SUBPATTERN:
+            _group, add_flags, del_flags, group_pattern = av
+            if add_flags or del_flags or not _is_portable_subpattern(group_pattern):
+                return False
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+            if not _is_portable_subpattern(av[2]):
+                return False
+        else:
+            return False
+
+    return True
+
+
+def _is_postgres_regex(pattern):
+    """
+    Whether `pattern` can be matched by the database.
+    """
+
+    if db.engine.dialect.name != "postgresql":
+        return False
+
+    try:
+        db.session.execute(
+            sqlalchemy.text("SELECT '' ~ :pattern"), {"pattern": pattern}
+        )
+        return True
+    except sqlalchemy.exc.DBAPIError:
+        db.session.rollback()
+        return False
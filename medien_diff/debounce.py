@@ -0,0 +1,83 @@
+"""
+Remembers which title changes were tweeted already, so that none of them is
+tweeted twice. Changes are stored in one Redis hash per day, each of which
+expires once it is older than `TWEET_DEBOUNCE_DAYS`.
+"""
+
+import time
+import hashlib
+
+from medien_diff import app, redis_conn
+
+_BUCKET_SECONDS = 60 * 60 * 24
+
+
+def _key(bucket):
+    return "medien_diff:tweeted:{}".format(bucket)
+
+
+def _field(newspaper_id, url, old, new):
+    hasher = hashlib.sha256()
+    hasher.update(str(newspaper_id).encode("ascii"))
+    hasher.update(b":")
+    hasher.update(url.encode("utf8"))
+    hasher.update(b":")
+    hasher.update(old.encode("utf8"))
+    hasher.update(b":")
+    hasher.update(new.encode("utf8"))
+    # Plenty to tell apart a few thousand changes per day
+    return hasher.digest()[:16]
+
+
+def _buckets():
+    current = int(time.time() // _BUCKET_SECONDS)
+    return range(current, current - app.config["TWEET_DEBOUNCE_DAYS"] - 1, -1)
+
+
+def seen(changes):
+    """
+    Return for each `(newspaper_id, url, old, new)` in `changes` whether it was
+    claimed already.
+    """
+
+    fields = [_field(*change) for change in changes]
+    if not fields:
+        return []
+
+    pipe = redis_conn.pipeline(transaction=False)
+    for bucket in _buckets():
+        pipe.hmget(_key(bucket), fields)
+    buckets = pipe.execute()
+
+    return [any(values[i] for values in buckets) for i in range(len(fields))]
+
+
+def claim(newspaper_id, url, old, new):
+    """
+    Remember that a change is being tweeted. Returns False if it was claimed
+    before.
+    """
+
+    change = newspaper_id, url, old, new
+    if seen([change])[0]:
+        return False
+
+    buckets = _buckets()
+    key = _key(buckets[0])
+    pipe = redis_conn.pipeline(transaction=False)
+    pipe.hsetnx(key, _field(*change), b"1")
+    pipe.expire(key, len(buckets) * _BUCKET_SECONDS)
+    claimed, _ = pipe.execute()
+    return bool(claimed)
+
+
+def release(newspaper_id, url, old, new):
+    """
+    Forget a claimed change, e.g. because tweeting it failed.
+    """
+
+    field = _field(newspaper_id, url, old, new)
+    pipe = redis_conn.pipeline(transaction=False)
+    for bucket in _buckets():
+        pipe.hdel(_key(bucket), field)
+    pipe.execute()
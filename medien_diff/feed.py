@@ -0,0 +1,175 @@
+"""
+Recently changed articles as JSON (`/changes.json`) or Atom
+(`/changes.atom`), newest first. Both take `?newspaper=<id>`, `?q=<words in
+the title>` and `?limit=<page size>`.
+
+Pages are keyset-paginated on `(changed_at, url)`: the `before` cursor of the
+next page is the last article of this one, so every page is a range scan of
+an index instead of an OFFSET over all the rows before it.
+"""
+
+import json
+import base64
+import datetime
+
+import flask
+import sqlalchemy
+
+from medien_diff.models import db, Newspaper, ArticleRevision
+
+blueprint = flask.Blueprint("feed", __name__)
+
+_PAGE_SIZE = 50
+_MAX_PAGE_SIZE = 500
+
+# Seconds a page may be cached by clients and proxies
+_MAX_AGE = 60
+
+
+@blueprint.route("/changes.json")
+def changes_json():
+    articles, next_cursor, count, names = _changes()
+
+    return _cacheable(
+        flask.jsonify(
+            estimated_count=count,
+            next=_page_url(".changes_json", next_cursor),
+            changes=[
+                {
+                    "newspaper_id": article.newspaper,
+                    "newspaper": names.get(article.newspaper),
+                    "url": article.url,
+                    "title": article.title,
+                    "changed_at": article.changed_at.isoformat(),
+                }
+                for article in articles
+            ],
+        )
+    )
+
+
+@blueprint.route("/changes.atom")
+def changes_atom():
+    articles, next_cursor, count, names = _changes()
+
+    atom = flask.render_template(
+        "changes.xml",
+        articles=articles,
+        names=names,
+        updated=articles[0].changed_at if articles else datetime.datetime.now(),
+        next_url=_page_url(".changes_atom", next_cursor),
+    )
+    return _cacheable(flask.Response(atom, mimetype="application/atom+xml"))
+
+
+def _changes():
+    """
+    Return the requested page as `(articles, next cursor, estimated count,
+    newspaper names by ID)`.
+    """
+
+    query = db.session.query(
+        ArticleRevision.newspaper,
+        ArticleRevision.url,
+        ArticleRevision.title,
+        ArticleRevision.changed_at,
+    ).filter(ArticleRevision.changed_at.isnot(None))
+
+    newspaper_id = flask.request.args.get("newspaper", type=int)
+    if newspaper_id is not None:
+        query = query.filter(ArticleRevision.newspaper == newspaper_id)
+
+    search = flask.request.args.get("q", "").strip()
+    if search:
+        # Backed by a trigram index on Postgres
+        query = query.filter(
+            ArticleRevision.title.ilike(
+                "%{}%".format(_escape_like(search)), escape="\\"
+            )
+        )
+
+    count = _estimated_count(query)
+
+    limit = min(flask.request.args.get("limit", _PAGE_SIZE, type=int), _MAX_PAGE_SIZE)
+    limit = max(limit, 1)
+
+    before = flask.request.args.get("before")
+    if before:
+        query = query.filter(
+            sqlalchemy.tuple_(ArticleRevision.changed_at, ArticleRevision.url)
+            < sqlalchemy.tuple_(*_decode_cursor(before))
+        )
+
+    articles = (
+        query.order_by(ArticleRevision.changed_at.desc(), ArticleRevision.url.desc())
+        .limit(limit + 1)
+        .all()
+    )
+
+    next_cursor = None
+    if len(articles) > limit:
+        articles = articles[:limit]
+        next_cursor = _encode_cursor(articles[-1])
+
+    names = {}
+    if articles:
+        names = dict(
+            db.session.query(Newspaper.id, Newspaper.name).filter(
+                Newspaper.id.in_({article.newspaper for article in articles})
+            )
+        )
+
+    return articles, next_cursor, count, names
+
+
+def _estimated_count(query):
+    """
+    Postgres' estimate of how many rows `query` returns, which unlike
+    `COUNT(*)` doesn't have to look at all of them.
+    """
+
+    if db.engine.dialect.name != "postgresql":
+        return query.count()
+
+    compiled = query.statement.compile(dialect=db.engine.dialect)
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.execute("EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params)
+        ((plan,),) = cursor.fetchall()
+    finally:
+        cursor.close()
+
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def _escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _encode_cursor(article):
+    cursor = json.dumps([article.changed_at.isoformat(), article.url])
+    return base64.urlsafe_b64encode(cursor.encode("utf8")).decode("ascii")
+
+
+def _decode_cursor(cursor):
+    try:
+        changed_at, url = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.datetime.fromisoformat(changed_at), url
+    except (ValueError, TypeError):
+        flask.abort(400)
+
+
+def _page_url(endpoint, cursor):
+    if cursor is None:
+        return None
+
+    args = flask.request.args.to_dict()
+    args["before"] = cursor
+    return flask.url_for(endpoint, _external=True, **args)
+
+
+def _cacheable(response):
+    response.cache_control.public = True
+    response.cache_control.max_age = _MAX_AGE
+    response.add_etag()
+    return response.make_conditional(flask.request)
@@ -0,0 +1,144 @@
+import json
+import hashlib
+import datetime
+
+from medien_diff import redis_conn
+from medien_diff.schedule import SEEN_RESOLUTION
+from medien_diff.text import is_significant_title_change
+
+
+def _key(newspaper_id):
+    return "medien_diff:frontpage:{}".format(newspaper_id)
+
+
+def body_fingerprint(paper, content):
+    # The links we extract also depend on the URL pattern
+    hasher = hashlib.sha256()
+    hasher.update(paper.article_url_pattern.pattern.encode("utf8"))
+    hasher.update(b":")
+    hasher.update(content)
+    return hasher.hexdigest()
+
+
+def links_fingerprint(links):
+    hasher = hashlib.sha256()
+    for link, teaser_title in sorted(links.items()):
+        hasher.update(link.encode("utf8"))
+        hasher.update(b"\t")
+        hasher.update((teaser_title or "").encode("utf8"))
+        hasher.update(b"\n")
+    return hasher.hexdigest()
+
+
+def load(newspaper_id):
+    """
+    Return `(body_fingerprint, links)` of the frontpage as seen last time, or
+    `(None, None)`. `links` maps article URLs to their teaser titles.
+    """
+
+    body, links = redis_conn.hmget(_key(newspaper_id), "body", "links")
+    if body is None or links is None:
+        return None, None
+
+    return body.decode("ascii"), json.loads(links)
+
+
+def store(newspaper_id, body, links):
+    """
+    Remember the frontpage's body fingerprint and article links (see
+    `load`). Returns whether the links changed since last time, in which case
+    they have to be planned again (see `plan_due_at`).
+    """
+
+    key = _key(newspaper_id)
+    fingerprint = links_fingerprint(links)
+    links_changed = redis_conn.hget(key, "links_fingerprint") != fingerprint.encode(
+        "ascii"
+    )
+
+    pipe = redis_conn.pipeline()
+    if links_changed:
+        pipe.hset(
+            key,
+            mapping={
+                "body": body,
+                "links_fingerprint": fingerprint,
+                "links": json.dumps(links),
+            },
+        )
+        pipe.hdel(key, "plan_due_at")
+    else:
+        pipe.hset(key, "body", body)
+    pipe.execute()
+    return links_changed
+
+
+def plan_due_at(newspaper_id):
+    """
+    Return when the stored links have to be planned (see `plan_fetches`)
+    again, or None if on the next run.
+    """
+
+    due_at = redis_conn.hget(_key(newspaper_id), "plan_due_at")
+    if due_at is None:
+        return None
+
+    return datetime.datetime.fromisoformat(due_at.decode("ascii"))
+
+
+def set_plan_due_at(newspaper_id, due_at):
+    key = _key(newspaper_id)
+    if due_at is None:
+        redis_conn.hdel(key, "plan_due_at")
+    else:
+        redis_conn.hset(key, "plan_due_at", due_at.isoformat())
+
+
+def plan_fetches(links, rows, now):
+    """
+    Decide which articles linked from the frontpage need to be fetched.
+    `links` maps URLs to teaser titles (see `load`), `rows` maps URLs of known
+    articles to their `(title, next_fetch_at)`.
+
+    Returns `(fetch, confirmed)`: URLs to fetch, and URLs that are due but
+    whose teaser title shows they haven't changed.
+    """
+
+    fetch = []
+    confirmed = []
+
+    for url, teaser_title in links.items():
+        if url not in rows:
+            fetch.append(url)
+            continue
+
+        title, next_fetch_at = rows[url]
+        due = next_fetch_at is None or next_fetch_at <= now
+
+        if teaser_title is None:
+            if due:
+                fetch.append(url)
+        elif is_significant_title_change(title, teaser_title):
+            # Don't wait for the schedule, we know something changed
+            fetch.append(url)
+        elif due:
+            confirmed.append(url)
+
+    return fetch, confirmed
+
+
+def next_plan_at(rows, fetch, confirmed, now):
+    """
+    Return until when planning the same links again can't make a difference,
+    given the outcome of `plan_fetches`, or None if it can on the next run.
+    """
+
+    # Until their results are written, they'd be planned again
+    if fetch or confirmed:
+        return None
+
+    # Sightings have to be recorded once per SEEN_RESOLUTION, and the articles
+    # confirmed once they are due. Not being due, all have a next_fetch_at.
+    return min(
+        [now + SEEN_RESOLUTION] + [next_fetch_at for _, next_fetch_at in rows.values()]
+    )
@@ -0,0 +1,137 @@
+"""
+Maintenance of and queries against the title history, `TitleRevision`.
+
+On Postgres, the history is partitioned by month: `title_revision_2020_07`
+holds July 2020, and `title_revision_default` whatever arrives before its
+month's partition exists. Partitions are created ahead of time by
+`ensure_partitions`, and old months are dropped as a whole by
+`drop_partitions`.
+"""
+
+import re
+import logging
+import datetime
+
+import sqlalchemy
+
+from medien_diff.models import db, Title, TitleRevision
+
+logger = logging.Logger(__name__)
+
+_PARTITION_RE = re.compile(r"^title_revision_(\d{4})_(\d{2})$")
+
+
+def _month(at):
+    return datetime.datetime(at.year, at.month, 1)
+
+
+def _next_month(month):
+    return (month + datetime.timedelta(days=32)).replace(day=1)
+
+
+def _partition_name(month):
+    return "title_revision_{:04}_{:02}".format(month.year, month.month)
+
+
+def ensure_partitions(now):
+    """
+    Create the partitions for the month of `now` and the following one, if
+    they don't exist yet.
+    """
+
+    if db.engine.dialect.name != "postgresql":
+        return
+
+    month = _month(now)
+    for month in month, _next_month(month):
+        name = _partition_name(month)
+        exists = db.session.execute(
+            sqlalchemy.text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}
+        ).scalar()
+        if not exists:
+            _create_partition(name, month, _next_month(month))
+            logger.info("history.partition_created", extra={"partition": name})
+
+    db.session.commit()
+
+
+def _create_partition(name, start, end):
+    # Rows of that month may already be in the default partition, which
+    # Postgres refuses to attach a partition next to. Move them first.
+    params = {"start": start, "end": end}
+    db.session.execute(
+        sqlalchemy.text(
+            "CREATE TABLE {} (LIKE title_revision INCLUDING DEFAULTS "
+            "INCLUDING CONSTRAINTS)".format(name)
+        )
+    )
+    db.session.execute(
+        sqlalchemy.text(
+            "WITH moved AS (DELETE FROM title_revision_default "
+            "WHERE seen_at >= :start AND seen_at < :end RETURNING *) "
+            "INSERT INTO {} SELECT * FROM moved".format(name)
+        ),
+        params,
+    )
+    db.session.execute(
+        sqlalchemy.text(
+            "ALTER TABLE title_revision ATTACH PARTITION {} "
+            "FOR VALUES FROM (:start) TO (:end)".format(name)
+        ),
+        params,
+    )
+
+
+def drop_partitions(before):
+    """
+    Delete the history of all months before the one of `before`, and titles
+    only used there. Returns the names of the dropped partitions.
+    """
+
+    before = _month(before)
+    dropped = []
+
+    if db.engine.dialect.name == "postgresql":
+        partitions = db.session.execute(
+            sqlalchemy.text(
+                "SELECT inhrelid::regclass::text FROM pg_inherits "
+                "WHERE inhparent = 'title_revision'::regclass"
+            )
+        )
+        for (name,) in partitions.fetchall():
+            match = _PARTITION_RE.match(name)
+            if match and datetime.datetime(*map(int, match.groups()), 1) < before:
+                db.session.execute(sqlalchemy.text("DROP TABLE {}".format(name)))
+                dropped.append(name)
+
+    # Partitions don't cover everything, e.g. the default one
+    db.session.query(TitleRevision).filter(TitleRevision.seen_at < before).delete(
+        synchronize_session=False
+    )
+    db.session.query(Title).filter(
+        ~sqlalchemy.exists().where(TitleRevision.title_id == Title.id)
+    ).delete(synchronize_session=False)
+
+    db.session.commit()
+    return dropped
+
+
+def change_counts(since):
+    """
+    Return `{newspaper ID: (articles, significant changes)}` as seen since
+    `since`, i.e. how many articles got a new title and how many of those
+    titles were tweet-worthy.
+    """
+
+    return {
+        newspaper_id: (articles, changes or 0)
+        for newspaper_id, articles, changes in db.session.query(
+            TitleRevision.newspaper,
+            sqlalchemy.func.count(sqlalchemy.distinct(TitleRevision.url)),
+            sqlalchemy.func.sum(
+                sqlalchemy.case([(TitleRevision.significant, 1)], else_=0)
+            ),
+        )
+        .filter(TitleRevision.seen_at >= since)
+        .group_by(TitleRevision.newspaper)
+    }
@@ -1,6 +1,7 @@
 import lxml.etree
 
 import cssselect
+from cssselect.parser import CombinedSelector
 
 
 def to_string(node, strip=False):
@@ -12,3 +13,76 @@ def to_string(node, strip=False):
 
 def css(selector):
     return cssselect.GenericTranslator().css_to_xpath(selector)
+
+
+class IncrementalMatcher(object):
+    """
+    Tests elements against a CSS selector while the document is still being
+    parsed. Only works for selectors that don't depend on what comes after the
+    element, see `incremental_matcher`.
+    """
+
+    def __init__(self, xpath, rightmost_xpaths):
+        self._xpath = lxml.etree.XPath(xpath)
+        # Cheap checks that rule out most elements before evaluating the whole
+        # selector against the partial tree.
+        self._candidate_xpaths = [lxml.etree.XPath(x) for x in rightmost_xpaths]
+
+    def matches(self, element):
+        if not any(xpath(element) for xpath in self._candidate_xpaths):
+            return False
+
+        return any(m is element for m in self._xpath(element.getroottree()))
+
+
+def incremental_matcher(selector):
+    """
+    Return an `IncrementalMatcher` for `selector`, or None if whether an
+    element matches can only be decided once the whole document is known
+    (e.g. `:last-child`).
+    """
+
+    translator = cssselect.GenericTranslator()
+    try:
+        selectors = cssselect.parse(selector)
+        xpath = translator.css_to_xpath(selector)
+    except (cssselect.SelectorError, cssselect.ExpressionError):
+        return None
+
+    # Conditions on later siblings, which haven't been parsed yet when an
+    # element ends. Up to cssselect 1.1, e.g. `:only-child` counts the
+    # parent's children rather than the following siblings.
+    if any(part in xpath for part in ("following", "last()", "parent::")):
+        return None
+
+    rightmost_xpaths = []
+    for parsed in selectors:
+        tree = parsed.parsed_tree
+        if isinstance(tree, CombinedSelector):
+            tree = tree.subselector
+        rightmost_xpaths.append("self::" + str(translator.xpath(tree)))
+
+    return IncrementalMatcher(xpath, rightmost_xpaths)
+
+
+def stream_first_match(chunks, matcher, encoding=None):
+    """
+    Feed `chunks` of HTML into an incremental parser until an element matching
+    `matcher` has been closed, and return it. The remaining chunks are not
+    consumed. Returns None if the document does not contain a match.
+    """
+
+    parser = lxml.etree.HTMLPullParser(events=("end",), encoding=encoding)
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        for _, element in parser.read_events():
+            if matcher.matches(element):
+                return element
+
+    parser.close()
+    for _, element in parser.read_events():
+        if matcher.matches(element):
+            return element
+
+    return None
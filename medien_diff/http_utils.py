@@ -0,0 +1,134 @@
+import time
+import hashlib
+import urllib
+
+import requests
+import requests.adapters
+
+from medien_diff import app, redis_conn
+
+http_session = requests.session()
+requests.utils.add_dict_to_cookiejar(
+    http_session.cookies, {"DSGVO_ZUSAGE_V1": "true",}  # derstandard needs this
+)
+
+_adapter = requests.adapters.HTTPAdapter(
+    pool_connections=app.config["HTTP_POOL_CONNECTIONS"],
+    pool_maxsize=app.config["HTTP_POOL_MAXSIZE"],
+)
+http_session.mount("http://", _adapter)
+http_session.mount("https://", _adapter)
+
+# Validators of pages that are no longer fetched expire eventually
+_VALIDATORS_TTL = 60 * 60 * 24 * 30
+
+
+def _validators_key(url):
+    return "medien_diff:validators:{}".format(
+        hashlib.sha256(url.encode("utf8")).hexdigest()
+    )
+
+
+def conditional_get(url, revalidate=True, max_requests_per_second=None, **kwargs):
+    """
+    GET `url`, sending the ETag/Last-Modified validators of the previous
+    response (see `store_validators`). A 304 response means the page did not
+    change since then.
+
+    If `max_requests_per_second` is given, wait until the host's rate limit
+    allows another request. Unless a `timeout` is given, `HTTP_CONNECT_TIMEOUT`
+    and `HTTP_READ_TIMEOUT` apply.
+    """
+
+    if max_requests_per_second:
+        throttle(url, max_requests_per_second)
+
+    headers = dict(kwargs.pop("headers", None) or {})
+
+    if revalidate:
+        validators = redis_conn.hgetall(_validators_key(url))
+        if b"etag" in validators:
+            headers["If-None-Match"] = validators[b"etag"].decode("latin1")
+        if b"last_modified" in validators:
+            headers["If-Modified-Since"] = validators[b"last_modified"].decode("latin1")
+
+    # A site that hangs must fail like any other, and not block a worker
+    kwargs.setdefault(
+        "timeout", (app.config["HTTP_CONNECT_TIMEOUT"], app.config["HTTP_READ_TIMEOUT"])
+    )
+
+    return http_session.get(url, headers=headers, **kwargs)
+
+
+def store_validators(url, response):
+    """
+    Remember validators of `response` for the next `conditional_get(url)`. Only
+    call this once the response has been processed successfully, otherwise a
+    broken page is never looked at again.
+    """
+
+    validators = {}
+    if response.headers.get("ETag"):
+        validators["etag"] = response.headers["ETag"]
+    if response.headers.get("Last-Modified"):
+        validators["last_modified"] = response.headers["Last-Modified"]
+
+    key = _validators_key(url)
+    pipe = redis_conn.pipeline()
+    pipe.delete(key)
+    if validators:
+        pipe.hset(key, mapping=validators)
+        pipe.expire(key, _VALIDATORS_TTL)
+    pipe.execute()
+
+
+def forget_validators(url):
+    redis_conn.delete(_validators_key(url))
+
+
+# Token bucket shared by all workers. Every caller takes a token right away,
+# even if that makes the balance negative, and is told how long to wait for
+# it. That way concurrent callers line up instead of polling.
+_TOKEN_BUCKET = redis_conn.register_script(
+    """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+
+local state = redis.call("HMGET", KEYS[1], "tokens", "updated_at")
+local tokens = tonumber(state[1]) or burst
+local updated_at = tonumber(state[2]) or now
+
+tokens = math.min(burst, tokens + math.max(0, now - updated_at) * rate) - 1
+
+redis.call("HSET", KEYS[1], "tokens", tokens, "updated_at", now)
+redis.call("PEXPIRE", KEYS[1], math.ceil((burst - tokens) / rate * 1000) + 1000)
+
+return tostring(math.max(0, -tokens) / rate)
+"""
+)
+
+
+def throttle(url, max_requests_per_second):
+    """
+    Block until a request to the host of `url` is allowed. The budget is per
+    host and shared across processes through Redis, bursts of up to one
+    second's worth of requests are allowed.
+    """
+
+    host = urllib.parse.urlsplit(url).netloc
+    wait = float(
+        _TOKEN_BUCKET(
+            keys=["medien_diff:rate_limit:{}".format(host)],
+            args=[
+                max_requests_per_second,
+                max(1, max_requests_per_second),
+                "{:.6f}".format(time.time()),
+            ],
+            # Not the client it was registered with, which tests replace
+            client=redis_conn,
+        )
+    )
+
+    if wait > 0:
+        time.sleep(wait)
@@ -0,0 +1,34 @@
+import hashlib
+
+from medien_diff import redis_conn
+
+# Upper bound for how long an article job may sit in a queue. If a worker dies
+# without releasing the claim, the URL can be enqueued again after that.
+INFLIGHT_TTL = 60 * 60
+
+
+def _key(newspaper_id, url):
+    return "medien_diff:inflight:{}:{}".format(
+        newspaper_id, hashlib.sha256(url.encode("utf8")).hexdigest()
+    )
+
+
+def claim(articles):
+    """
+    Mark `(newspaper_id, url)` pairs as queued and return those that weren't
+    already, in order. Duplicates within `articles` are only returned once.
+    """
+
+    articles = list(dict.fromkeys(articles))
+    if not articles:
+        return []
+
+    pipe = redis_conn.pipeline(transaction=False)
+    for newspaper_id, url in articles:
+        pipe.set(_key(newspaper_id, url), b"1", nx=True, ex=INFLIGHT_TTL)
+
+    return [article for article, claimed in zip(articles, pipe.execute()) if claimed]
+
+
+def release(newspaper_id, url):
+    redis_conn.delete(_key(newspaper_id, url))
@@ -0,0 +1,176 @@
+import json
+import time
+import bisect
+import threading
+import contextlib
+import collections
+
+from medien_diff import ALL_QUEUES, redis_conn
+from medien_diff import persistence
+
+_COUNTERS_KEY = "medien_diff:metrics:counters"
+_HISTOGRAMS_KEY = "medien_diff:metrics:histograms"
+
+_PREFIX = "medien_diff_"
+
+# Upper bounds of histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Metrics are buffered per process and written to Redis by `flush`, which the
+# `job` decorator calls after every job.
+_lock = threading.Lock()
+_counters = collections.Counter()
+# (name, labels) -> [count per bucket..., count above last bucket, sum]
+_histograms = {}
+
+
+def _series(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def incr(name, value=1, **labels):
+    with _lock:
+        _counters[_series(name, labels)] += value
+
+
+def observe(name, seconds, **labels):
+    series = _series(name, labels)
+    with _lock:
+        histogram = _histograms.setdefault(series, [0] * (len(BUCKETS) + 1) + [0.0])
+        histogram[bisect.bisect_left(BUCKETS, seconds)] += 1
+        histogram[-1] += seconds
+
+
+@contextlib.contextmanager
+def timer(name, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def flush():
+    """
+    Add the metrics buffered by this process to the totals in Redis.
+    """
+
+    global _counters, _histograms
+
+    with _lock:
+        counters, _counters = _counters, collections.Counter()
+        histograms, _histograms = _histograms, {}
+
+    if not counters and not histograms:
+        return
+
+    pipe = redis_conn.pipeline(transaction=False)
+
+    for (name, labels), value in counters.items():
+        pipe.hincrbyfloat(_COUNTERS_KEY, json.dumps([name, labels]), value)
+
+    for (name, labels), histogram in histograms.items():
+        cumulative = 0
+        for le, count in zip(BUCKETS + ("+Inf",), histogram[:-1]):
+            cumulative += count
+            if cumulative:
+                field = json.dumps([name, labels, "bucket", le])
+                pipe.hincrbyfloat(_HISTOGRAMS_KEY, field, cumulative)
+
+        pipe.hincrbyfloat(
+            _HISTOGRAMS_KEY, json.dumps([name, labels, "count"]), cumulative
+        )
+        pipe.hincrbyfloat(
+            _HISTOGRAMS_KEY, json.dumps([name, labels, "sum"]), histogram[-1]
+        )
+
+    pipe.execute()
+
+
+def render():
+    """
+    Return all metrics in the Prometheus text format, including the current
+    queue depths.
+    """
+
+    lines = []
+    lines.extend(_render_counters())
+    lines.extend(_render_histograms())
+    lines.extend(_render_gauges())
+    return "".join(line + "\n" for line in lines)
+
+
+def _render_counters():
+    counters = sorted(
+        (json.loads(field), float(value))
+        for field, value in redis_conn.hgetall(_COUNTERS_KEY).items()
+    )
+
+    family = None
+    for (name, labels), value in counters:
+        if name != family:
+            family = name
+            yield "# TYPE {}{}_total counter".format(_PREFIX, name)
+        yield "{}{}_total{} {}".format(_PREFIX, name, _labels(labels), value)
+
+
+def _render_histograms():
+    suffixes = {"bucket": 0, "count": 1, "sum": 2}
+
+    def sort_key(item):
+        name, labels, suffix, *le = item[0]
+        le = float(le[0]) if le else 0
+        return name, labels, suffixes[suffix], le
+
+    histograms = sorted(
+        (
+            (json.loads(field), float(value))
+            for field, value in redis_conn.hgetall(_HISTOGRAMS_KEY).items()
+        ),
+        key=sort_key,
+    )
+
+    family = None
+    for (name, labels, suffix, *le), value in histograms:
+        if name != family:
+            family = name
+            yield "# TYPE {}{} histogram".format(_PREFIX, name)
+        if le:
+            labels = labels + [["le", str(le[0])]]
+        yield "{}{}_{}{} {}".format(_PREFIX, name, suffix, _labels(labels), value)
+
+
+def _render_gauges():
+    gauges = collections.defaultdict(list)
+
+    for name, queue in sorted(ALL_QUEUES.items()):
+        labels = [["queue", name]]
+        gauges["queue_jobs"].append((labels, queue.count))
+        gauges["queue_started_jobs"].append((labels, queue.started_job_registry.count))
+        gauges["queue_scheduled_jobs"].append(
+            (labels, queue.scheduled_job_registry.count)
+        )
+        gauges["queue_failed_jobs"].append((labels, queue.failed_job_registry.count))
+
+    gauges["pending_article_results"].append(([], persistence.pending_results()))
+    gauges["failed_article_results"].append(([], persistence.failed_results()))
+
+    for name, values in gauges.items():
+        yield "# TYPE {}{} gauge".format(_PREFIX, name)
+        for labels, value in values:
+            yield "{}{}{} {}".format(_PREFIX, name, _labels(labels), value)
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+
+    return "{{{}}}".format(
+        ",".join(
+            '{}="{}"'.format(
+                key,
+                value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+            )
+            for key, value in labels
+        )
+    )
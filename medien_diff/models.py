@@ -1,51 +1,27 @@
+import sqlalchemy
+import sqlalchemy.event
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-
-from flask_admin.form import rules
 
 db = SQLAlchemy()
-migrate = Migrate()
 
 
 def init_db(app):
     db.init_app(app)
-    migrate.init_app(app, db)
     return db
 
 
 class Newspaper(db.Model):
     __tablename__ = "newspaper"
 
-    form_create_rules = form_edit_rules = (
-        rules.HTML("<p>Name of the newspaper. For example: <code>Der Standard</code>"),
-        "name",
-        rules.HTML(
-            "<p>URL of the frontpage or some other page where all the articles are linked. For example: <code>https://www.derstandard.at/frontpage/latest</code>"
-        ),
-        "base_url",
-        rules.HTML(
-            "<p>Regex that matches against article URLs. For example: <code>^https://www.derstandard.at/story/</code>"
-        ),
-        "article_url_pattern",
-        rules.HTML(
-            "<p>CSS selector that matches the title text when viewing the article page. For example: <code>.article-title</code>"
-        ),
-        "article_title_css_selector",
-        rules.HTML(
-            "<p>Twitter credentials to use to post to Twitter. Consumer = Twitter app, Access token = Login into an account. Use <code>make twitter</code> to generate the latter."
-        ),
-        "twitter_consumer_key",
-        "twitter_consumer_secret",
-        "twitter_access_token_key",
-        "twitter_access_token_secret",
-    )
-
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     base_url = db.Column(db.String)
     article_url_pattern = db.Column(db.String)
 
     article_title_css_selector = db.Column(db.String)
+    teaser_title_css_selector = db.Column(db.String)
+
+    max_requests_per_second = db.Column(db.Float)
 
     twitter_consumer_key = db.Column(db.String)
     twitter_consumer_secret = db.Column(db.String)
@@ -59,6 +35,95 @@ class ArticleRevision(db.Model):
     newspaper = db.Column(db.Integer, db.ForeignKey("newspaper.id"))
     url = db.Column(db.String, primary_key=True)
     fetched_at = db.Column(db.DateTime)
-    changed_at = db.Column(db.DateTime, index=True)
+    changed_at = db.Column(db.DateTime)
+    next_fetch_at = db.Column(db.DateTime, index=True)
+    # Last time the article was linked from its newspaper's frontpage, see
+    # medien_diff.schedule.EXPIRE_AFTER
+    seen_on_frontpage_at = db.Column(db.DateTime)
 
     title = db.Column(db.String)
+
+    # For paginating and searching the change feed, see medien_diff.feed
+    __table_args__ = (
+        db.Index("ix_article_revision_changed_at_url", "changed_at", "url"),
+        db.Index(
+            "ix_article_revision_newspaper_changed_at_url",
+            "newspaper",
+            "changed_at",
+            "url",
+        ),
+        db.Index(
+            "ix_article_revision_title_trgm",
+            "title",
+            postgresql_using="gin",
+            postgresql_ops={"title": "gin_trgm_ops"},
+        ),
+    )
+
+
+# The trigram index needs this, see the migration for it
+sqlalchemy.event.listen(
+    ArticleRevision.__table__,
+    "before_create",
+    sqlalchemy.DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(
+        dialect="postgresql"
+    ),
+)
+
+
+class UrlAlias(db.Model):
+    """
+    Where a URL linked from a frontpage really leads to, learned from
+    redirects and `<link rel=canonical>` when fetching it.
+    """
+
+    __tablename__ = "url_alias"
+
+    url = db.Column(db.String, primary_key=True)
+    canonical_url = db.Column(db.String, nullable=False, index=True)
+
+
+class Title(db.Model):
+    """
+    Every title seen so far, stored once. See TitleRevision.
+    """
+
+    __tablename__ = "title"
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Truncated SHA-256 of the text, to look titles up by
+    digest = db.Column(db.LargeBinary, nullable=False, unique=True)
+    text = db.Column(db.String, nullable=False)
+
+
+class TitleRevision(db.Model):
+    """
+    Append-only log of the titles fetched for each article. `significant` is
+    whether the title was a significant change from the article's previous one
+    (never for its first title). On Postgres the table is partitioned by month
+    of `seen_at`, see medien_diff.history.
+    """
+
+    __tablename__ = "title_revision"
+
+    url = db.Column(db.String, primary_key=True)
+    seen_at = db.Column(db.DateTime, primary_key=True)
+    # No foreign key, the history outlives deleted articles and newspapers
+    newspaper = db.Column(db.Integer, nullable=False)
+    title_id = db.Column(db.Integer, db.ForeignKey("title.id"), nullable=False)
+    significant = db.Column(db.Boolean, nullable=False)
+
+    __table_args__ = (
+        db.Index("ix_title_revision_newspaper_seen_at", "newspaper", "seen_at"),
+        {"postgresql_partition_by": "RANGE (seen_at)"},
+    )
+
+
+# Catches rows no monthly partition has been created for yet
+sqlalchemy.event.listen(
+    TitleRevision.__table__,
+    "after_create",
+    sqlalchemy.DDL(
+        "CREATE TABLE title_revision_default PARTITION OF title_revision DEFAULT"
+    ).execute_if(dialect="postgresql"),
+)
@@ -0,0 +1,321 @@
+import json
+import hashlib
+import datetime
+
+from medien_diff import redis_conn
+from medien_diff.models import db, ArticleRevision, UrlAlias, Title, TitleRevision
+from medien_diff.text import is_significant_title_change
+from medien_diff.schedule import next_fetch_at
+
+_RESULTS_KEY = "medien_diff:article_results"
+# Results that can't be written on their own, see `bury_result`
+_FAILED_RESULTS_KEY = "medien_diff:article_results:failed"
+
+_COLUMNS = ("newspaper", "url", "title", "fetched_at", "changed_at", "next_fetch_at")
+
+
+def record_result(
+    newspaper_id,
+    url,
+    final_url=None,
+    title=None,
+    fetched_at=None,
+    delete=False,
+    delete_if_no_change=False,
+):
+    """
+    Buffer the result of fetching an article until the next
+    `write_results`. `title=None` means the article is known not to have
+    changed (e.g. HTTP 304), `delete=True` drops the article altogether.
+
+    Returns the number of buffered results.
+    """
+
+    return redis_conn.rpush(
+        _RESULTS_KEY,
+        json.dumps(
+            {
+                "newspaper_id": newspaper_id,
+                "url": url,
+                "final_url": final_url or url,
+                "title": title,
+                "fetched_at": (fetched_at or datetime.datetime.now()).isoformat(),
+                "delete": delete,
+                "delete_if_no_change": delete_if_no_change,
+            }
+        ),
+    )
+
+
+def pending_results():
+    return redis_conn.llen(_RESULTS_KEY)
+
+
+def take_results(count):
+    pipe = redis_conn.pipeline()
+    pipe.lrange(_RESULTS_KEY, 0, count - 1)
+    pipe.ltrim(_RESULTS_KEY, count, -1)
+    raw_results, _ = pipe.execute()
+    return raw_results
+
+
+def return_results(raw_results):
+    if raw_results:
+        redis_conn.lpush(_RESULTS_KEY, *reversed(raw_results))
+
+
+def bury_result(raw_result):
+    """
+    Set aside a result that failed to be written, so that it doesn't hold up
+    the ones after it. `retry_failed_results` puts them back.
+    """
+
+    redis_conn.rpush(_FAILED_RESULTS_KEY, raw_result)
+
+
+def failed_results():
+    return redis_conn.llen(_FAILED_RESULTS_KEY)
+
+
+def retry_failed_results():
+    """
+    Move all failed results back to the buffer. Returns their number.
+    """
+
+    pipe = redis_conn.pipeline()
+    pipe.lrange(_FAILED_RESULTS_KEY, 0, -1)
+    pipe.delete(_FAILED_RESULTS_KEY)
+    raw_results, _ = pipe.execute()
+
+    if raw_results:
+        redis_conn.rpush(_RESULTS_KEY, *raw_results)
+    return len(raw_results)
+
+
+def write_results(raw_results):
+    """
+    Persist a batch of buffered results in one transaction: one SELECT of the
+    affected rows, one DELETE and one INSERT ... ON CONFLICT DO UPDATE each for
+    articles and their aliases, and a few INSERTs for their title history.
+
+    Returns `(changes, lost)`: the significant title changes as
+    `(newspaper_id, url, old, new)` tuples, and URLs that were reported as
+    unchanged but have no row.
+    """
+
+    results = [_load_result(raw) for raw in raw_results]
+
+    urls = {r["url"] for r in results} | {r["final_url"] for r in results}
+    rows = {
+        article.url: {c: getattr(article, c) for c in _COLUMNS}
+        for article in db.session.query(ArticleRevision).filter(
+            ArticleRevision.url.in_(urls)
+        )
+    }
+
+    upserts, deletes, changes, lost, revisions = merge_results(rows, results)
+
+    if deletes:
+        db.session.query(ArticleRevision).filter(
+            ArticleRevision.url.in_(deletes)
+        ).delete(synchronize_session=False)
+        db.session.query(UrlAlias).filter(UrlAlias.canonical_url.in_(deletes)).delete(
+            synchronize_session=False
+        )
+
+    if upserts:
+        # New articles were just found on their frontpage. Later sightings are
+        # recorded by the frontpage job, so they are never updated here.
+        stmt = _insert(ArticleRevision.__table__).values(
+            [
+                dict(article, seen_on_frontpage_at=article["fetched_at"])
+                for article in upserts.values()
+            ]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ArticleRevision.url],
+            set_={c: stmt.excluded[c] for c in _COLUMNS if c != "url"},
+        )
+        db.session.execute(stmt)
+
+    aliases = {
+        r["url"]: r["final_url"]
+        for r in results
+        if r["final_url"] != r["url"] and r["final_url"] not in deletes
+    }
+    if aliases:
+        stmt = _insert(UrlAlias.__table__).values(
+            [{"url": url, "canonical_url": c} for url, c in aliases.items()]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UrlAlias.url],
+            set_={"canonical_url": stmt.excluded.canonical_url},
+        )
+        db.session.execute(stmt)
+
+    if revisions:
+        _write_revisions(revisions)
+
+    db.session.commit()
+    return changes, lost
+
+
+def _write_revisions(revisions):
+    texts = {_digest(r["title"]): r["title"] for r in revisions}
+
+    stmt = _insert(Title.__table__).values(
+        [{"digest": digest, "text": text} for digest, text in texts.items()]
+    )
+    db.session.execute(stmt.on_conflict_do_nothing(index_elements=[Title.digest]))
+    title_ids = dict(
+        db.session.query(Title.digest, Title.id).filter(Title.digest.in_(texts))
+    )
+
+    stmt = _insert(TitleRevision.__table__).values(
+        [
+            {
+                "url": r["url"],
+                "seen_at": r["seen_at"],
+                "newspaper": r["newspaper"],
+                "title_id": title_ids[_digest(r["title"])],
+                "significant": r["significant"],
+            }
+            for r in revisions
+        ]
+    )
+    # Only if two URLs redirecting to the same article were fetched at once
+    db.session.execute(stmt.on_conflict_do_nothing())
+
+
+def _digest(title):
+    return hashlib.sha256(title.encode("utf8")).digest()[:16]
+
+
+def resolve_aliases(links):
+    """
+    Replace URLs in `links` (URL -> teaser title) by what they are known to
+    lead to. Of several links to the same article, one with a teaser title is
+    kept.
+    """
+
+    aliases = dict(
+        db.session.query(UrlAlias.url, UrlAlias.canonical_url).filter(
+            UrlAlias.url.in_(links)
+        )
+    )
+    if not aliases:
+        return links
+
+    resolved = {}
+    for url, teaser_title in links.items():
+        url = aliases.get(url, url)
+        if resolved.get(url) is None:
+            resolved[url] = teaser_title
+
+    return resolved
+
+
+def merge_results(rows, results):
+    """
+    Apply `results` in order to `rows` (url -> row dict, modified in place).
+
+    Returns `(upserts, deletes, changes, lost, revisions)`, see
+    `write_results`. `revisions` are the new and changed titles as rows of
+    `TitleRevision`, with the title's text instead of its ID.
+    """
+
+    upserts = {}
+    deletes = set()
+    changes = []
+    lost = []
+    revisions = []
+
+    def drop(url):
+        rows.pop(url, None)
+        upserts.pop(url, None)
+        deletes.add(url)
+
+    def revise(article, title, fetched_at, significant):
+        revisions.append(
+            {
+                "url": article["url"],
+                "seen_at": fetched_at,
+                "newspaper": article["newspaper"],
+                "title": title,
+                "significant": significant,
+            }
+        )
+
+    for result in results:
+        url = result["url"]
+        final_url = result["final_url"]
+
+        if result["delete"]:
+            drop(url)
+            continue
+
+        article = rows.get(final_url)
+        if article is None and url in rows:
+            # The article now redirects somewhere else, move it
+            article = dict(rows[url], url=final_url)
+            drop(url)
+        elif final_url != url and url in rows:
+            drop(url)
+
+        title = result["title"]
+        fetched_at = result["fetched_at"]
+
+        if article is None:
+            if title is None:
+                lost.append(url)
+                continue
+
+            article = {
+                "newspaper": result["newspaper_id"],
+                "url": final_url,
+                "title": title,
+                "fetched_at": fetched_at,
+                "changed_at": fetched_at,
+            }
+            revise(article, title, fetched_at, False)
+        else:
+            changed = title is not None and is_significant_title_change(
+                article["title"], title
+            )
+            # Insignificant changes too, to tune is_significant_title_change
+            if title is not None and title != article["title"]:
+                revise(article, title, fetched_at, changed)
+
+            if changed:
+                changes.append((result["newspaper_id"], url, article["title"], title))
+                article["title"] = title
+                article["changed_at"] = fetched_at
+
+            article["fetched_at"] = fetched_at
+
+            if not changed and result["delete_if_no_change"]:
+                drop(final_url)
+                continue
+
+        article["next_fetch_at"] = next_fetch_at(
+            article["fetched_at"], article["changed_at"]
+        )
+        rows[final_url] = upserts[final_url] = article
+        deletes.discard(final_url)
+
+    return upserts, deletes, changes, lost, revisions
+
+
+def _load_result(raw):
+    result = json.loads(raw)
+    result["fetched_at"] = datetime.datetime.fromisoformat(result["fetched_at"])
+    return result
+
+
+def _insert(table):
+    if db.engine.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+
+    return insert(table)
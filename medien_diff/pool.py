@@ -0,0 +1,123 @@
+import os
+import sys
+import time
+import signal
+import logging
+
+from medien_diff import db, redis_conn
+from medien_diff.worker import RoundRobinSimpleWorker
+
+logger = logging.Logger(__name__)
+
+# Seconds between checks for exited workers and new jobs
+_POLL_INTERVAL = 0.1
+
+
+class WorkerPool(object):
+    """
+    A pool of preforked burst workers. `slots` has one list of queues per
+    worker process. The app and jobs are imported before forking.
+
+    A worker exits once its queues are empty, but is started again as soon as
+    other workers enqueue more jobs for it.
+    """
+
+    def __init__(self, slots):
+        self.slots = slots
+        # pid -> slot index
+        self.workers = {}
+        self.stopping = False
+
+    def run(self):
+        """
+        Work until all queues are empty and all workers have exited. Returns
+        False if the pool was shut down by SIGINT or SIGTERM instead.
+        """
+
+        handlers = {
+            signum: signal.signal(signum, self._stop)
+            for signum in (signal.SIGINT, signal.SIGTERM)
+        }
+
+        try:
+            while True:
+                if not self.stopping:
+                    self._start_workers()
+                if not self.workers:
+                    return not self.stopping
+                if not self._reap_workers():
+                    time.sleep(_POLL_INTERVAL)
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+
+    def _start_workers(self):
+        busy = set(self.workers.values())
+        counts = {}
+
+        for index, queues in enumerate(self.slots):
+            if index in busy:
+                continue
+
+            for queue in queues:
+                if queue.name not in counts:
+                    counts[queue.name] = queue.count
+            if any(counts[queue.name] for queue in queues):
+                self.workers[self._fork(queues)] = index
+
+    def _fork(self, queues):
+        # Connections must not be shared between processes
+        db.engine.dispose()
+
+        pid = os.fork()
+        if pid:
+            return pid
+
+        status = 1
+        try:
+            # rq installs its own handlers for a warm shutdown
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            RoundRobinSimpleWorker(queues, connection=redis_conn).work(burst=True)
+            status = 0
+        except BaseException:
+            logger.exception("pool.worker_crashed")
+        finally:
+            try:
+                _close_browsers()
+            finally:
+                os._exit(status)
+
+    def _reap_workers(self):
+        reaped = False
+
+        while self.workers:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if not pid:
+                break
+
+            reaped = True
+            index = self.workers.pop(pid, None)
+            if index is not None and status:
+                logger.error(
+                    "pool.worker_failed", extra={"slot": index, "status": status}
+                )
+
+        return reaped
+
+    def _stop(self, signum, frame):
+        self.stopping = True
+
+        # On Ctrl-C the whole process group gets SIGINT already, a second
+        # signal would make rq abort the current job.
+        if signum == signal.SIGTERM:
+            for pid in self.workers:
+                os.kill(pid, signal.SIGTERM)
+
+
+def _close_browsers():
+    # os._exit skips the atexit handler that would quit them. Only tweeting
+    # workers have imported (and started) browsers.
+    browser = sys.modules.get("medien_diff.browser")
+    if browser is not None:
+        browser.close_browser_pool()
@@ -0,0 +1,110 @@
+import re
+
+import lxml.etree
+import sqlalchemy.event
+import sqlalchemy.orm
+
+from medien_diff import redis_conn
+from medien_diff.models import db, Newspaper
+from medien_diff.html_utils import css, incremental_matcher
+
+_CHANGED_KEY = "medien_diff_changed_newspapers"
+
+
+class NewspaperProfile(object):
+    """
+    Everything a job needs to know about a newspaper, with regex and selectors
+    already compiled.
+    """
+
+    def __init__(self, paper):
+        self.id = paper.id
+        self.name = paper.name
+        self.base_url = paper.base_url
+        self.article_url_pattern = re.compile(paper.article_url_pattern)
+        self.max_requests_per_second = paper.max_requests_per_second
+
+        self.article_title_css_selector = paper.article_title_css_selector
+        self.article_title_xpath = lxml.etree.XPath(
+            css(paper.article_title_css_selector)
+        )
+        self.article_title_matcher = incremental_matcher(
+            paper.article_title_css_selector
+        )
+
+        # Evaluated relative to each article link on the frontpage
+        self.teaser_title_xpath = None
+        if paper.teaser_title_css_selector:
+            self.teaser_title_xpath = lxml.etree.XPath(
+                css(paper.teaser_title_css_selector)
+            )
+
+        self.twitter_consumer_key = paper.twitter_consumer_key
+        self.twitter_consumer_secret = paper.twitter_consumer_secret
+        self.twitter_access_token_key = paper.twitter_access_token_key
+        self.twitter_access_token_secret = paper.twitter_access_token_secret
+
+    @property
+    def has_twitter_credentials(self):
+        return bool(
+            self.twitter_consumer_key
+            and self.twitter_consumer_secret
+            and self.twitter_access_token_key
+            and self.twitter_access_token_secret
+        )
+
+
+# newspaper_id -> (version, profile)
+_profiles = {}
+
+
+def _version_key(newspaper_id):
+    return "medien_diff:newspaper_version:{}".format(newspaper_id)
+
+
+def get_profile(newspaper_id):
+    """
+    Return the `NewspaperProfile` for `newspaper_id`, or None if there is no
+    such newspaper. Profiles are cached per process and reloaded whenever the
+    newspaper's version counter in Redis changes, which costs one Redis GET
+    instead of a DB query and recompiling everything.
+    """
+
+    version = redis_conn.get(_version_key(newspaper_id))
+    cached = _profiles.get(newspaper_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    paper = db.session.query(Newspaper).get(newspaper_id)
+    if paper is None:
+        _profiles.pop(newspaper_id, None)
+        return None
+
+    profile = NewspaperProfile(paper)
+    _profiles[newspaper_id] = (version, profile)
+    return profile
+
+
+def invalidate_profile(newspaper_id):
+    redis_conn.incr(_version_key(newspaper_id))
+
+
+@sqlalchemy.event.listens_for(Newspaper, "after_insert")
+@sqlalchemy.event.listens_for(Newspaper, "after_update")
+@sqlalchemy.event.listens_for(Newspaper, "after_delete")
+def _newspaper_changed(mapper, connection, target):
+    session = sqlalchemy.orm.object_session(target)
+    session.info.setdefault(_CHANGED_KEY, set()).add(target.id)
+
+
+# Only bump versions once the change is visible to other transactions,
+# otherwise a worker could cache the old row again under the new version.
+@sqlalchemy.event.listens_for(sqlalchemy.orm.Session, "after_commit")
+def _invalidate_changed(session):
+    for newspaper_id in session.info.pop(_CHANGED_KEY, ()):
+        invalidate_profile(newspaper_id)
+
+
+@sqlalchemy.event.listens_for(sqlalchemy.orm.Session, "after_rollback")
+def _forget_changed(session):
+    session.info.pop(_CHANGED_KEY, None)
@@ -0,0 +1,177 @@
+import io
+import os
+import tempfile
+
+import flask
+import simplediff
+
+from medien_diff import metrics
+
+# Mirrors static/diff.css
+_FONT_SIZE = 16
+_LINE_HEIGHT = 20
+_PADDING_X = 2 * _FONT_SIZE
+_PADDING_Y = _FONT_SIZE
+# Width of the <p> when Chrome renders the page in its default window
+_WIDTH = 784
+_BACKGROUND = (211, 211, 211)
+_TEXT_COLOR = (0, 0, 0)
+_STYLES = {
+    "=": {"background": None, "strike": False, "bold": False},
+    "-": {"background": (255, 182, 193), "strike": True, "bold": False},
+    "+": {"background": (127, 255, 212), "strike": False, "bold": True},
+}
+
+
+def render_diff(old, new):
+    """
+    Render a word diff between two titles into PNG bytes, using the backend
+    configured in `DIFF_RENDERER`.
+    """
+
+    backend = flask.current_app.config["DIFF_RENDERER"]
+    try:
+        renderer = _RENDERERS[backend]
+    except KeyError:
+        raise ValueError("unknown DIFF_RENDERER: {!r}".format(backend))
+
+    with metrics.timer("render_seconds", renderer=backend):
+        return renderer(old, new)
+
+
+def render_diff_selenium(old, new):
+    from medien_diff.browser import get_browser_pool
+
+    with tempfile.NamedTemporaryFile(suffix=".html") as f:
+        f.write(b'<meta charset="utf-8">')
+        f.write(
+            '<link rel="stylesheet" href="file://{css_path}/diff.css">'.format(
+                css_path=flask.current_app.static_folder
+            ).encode("utf8")
+        )
+        f.write(b"<body><p>")
+        f.write(simplediff.html_diff(old, new).encode("utf8"))
+        f.write(b"</p></body>")
+        f.flush()
+
+        with get_browser_pool().browser() as driver:
+            driver.get("file://{}".format(f.name))
+            return driver.find_element_by_tag_name("p").screenshot_as_png
+
+
+def render_diff_pillow(old, new):
+    from PIL import Image, ImageDraw
+
+    static_folder = flask.current_app.static_folder
+    font = _load_font(os.path.join(static_folder, "Merriweather-Regular.ttf"))
+
+    lines = layout_diff(
+        simplediff.diff(old.split(), new.split()),
+        measure=lambda word, bold: font.getlength(word) + int(bold),
+        space_width=font.getlength(" "),
+        max_width=_WIDTH - 2 * _PADDING_X,
+    )
+
+    height = 2 * _PADDING_Y + max(len(lines), 1) * _LINE_HEIGHT
+    image = Image.new("RGB", (_WIDTH, height), _BACKGROUND)
+    _tile(image, os.path.join(static_folder, "paper_fibers.png"))
+    draw = ImageDraw.Draw(image)
+
+    for line_no, line in enumerate(lines):
+        top = _PADDING_Y + line_no * _LINE_HEIGHT
+        for x, width, text, op in line:
+            style = _STYLES[op]
+            left = _PADDING_X + x
+            if style["background"] is not None:
+                draw.rectangle(
+                    (left, top, left + width, top + _LINE_HEIGHT - 1),
+                    fill=style["background"],
+                )
+
+            # Center the glyphs vertically within the line box
+            text_top = top + (_LINE_HEIGHT - _FONT_SIZE) // 2 - 1
+            draw.text((left, text_top), text, font=font, fill=_TEXT_COLOR)
+            if style["bold"]:
+                draw.text((left + 1, text_top), text, font=font, fill=_TEXT_COLOR)
+            if style["strike"]:
+                strike_y = top + _LINE_HEIGHT // 2 + 1
+                draw.line((left, strike_y, left + width, strike_y), fill=_TEXT_COLOR)
+
+    buf = io.BytesIO()
+    # Favor speed over size, the upload is tiny either way
+    image.save(buf, format="PNG", compress_level=1)
+    return buf.getvalue()
+
+
+def layout_diff(diff, measure, space_width, max_width):
+    """
+    Break the words of a `simplediff.diff` result into lines of at most
+    `max_width`. Returns a list of lines, each a list of `(x, width, text, op)`
+    runs. Consecutive words of one run are merged so that backgrounds span the
+    spaces between them, like inline elements in the browser.
+    """
+
+    lines = [[]]
+    x = 0
+
+    for op, words in diff:
+        bold = _STYLES[op]["bold"]
+        for i, word in enumerate(words):
+            width = measure(word, bold)
+            if lines[-1] and x + space_width + width > max_width:
+                lines.append([])
+                x = 0
+            elif lines[-1]:
+                x += space_width
+
+            line = lines[-1]
+            if i > 0 and line and line[-1][3] == op and line[-1][0] + line[-1][1] < x:
+                start, _, text, _ = line[-1]
+                line[-1] = (start, x + width - start, text + " " + word, op)
+            else:
+                line.append((x, width, word, op))
+
+            x += width
+
+    if not lines[-1]:
+        lines.pop()
+
+    return lines
+
+
+_fonts = {}
+
+
+def _load_font(path):
+    from PIL import ImageFont
+
+    if path not in _fonts:
+        _fonts[path] = ImageFont.truetype(path, _FONT_SIZE)
+    return _fonts[path]
+
+
+_backgrounds = {}
+
+
+def _tile(image, path):
+    from PIL import Image
+
+    # Compositing the texture onto the background color is the expensive
+    # part, do it once for a full-width strip.
+    if path not in _backgrounds:
+        with Image.open(path) as tile:
+            tile = tile.convert("RGBA")
+            strip = Image.new("RGB", (_WIDTH, tile.height), _BACKGROUND)
+            for x in range(0, _WIDTH, tile.width):
+                strip.paste(tile, (x, 0), tile)
+            _backgrounds[path] = strip
+
+    strip = _backgrounds[path]
+    for y in range(0, image.height, strip.height):
+        image.paste(strip, (0, y))
+
+
+_RENDERERS = {
+    "selenium": render_diff_selenium,
+    "pillow": render_diff_pillow,
+}
@@ -0,0 +1,19 @@
+import datetime
+
+# Revisit an article after this fraction of the time its title has been
+# stable. Frequently edited articles are checked often, stable ones back off
+# exponentially.
+BACKOFF_FACTOR = 0.25
+MIN_INTERVAL = datetime.timedelta(minutes=10)
+MAX_INTERVAL = datetime.timedelta(days=7)
+
+# Articles that haven't been linked from their frontpage for this long are
+# dropped when they are due again and their title still hasn't changed.
+EXPIRE_AFTER = datetime.timedelta(days=7)
+# Frontpage sightings are only written to the DB once in that long
+SEEN_RESOLUTION = datetime.timedelta(hours=1)
+
+
+def next_fetch_at(fetched_at, changed_at):
+    interval = (fetched_at - changed_at) * BACKOFF_FACTOR
+    return fetched_at + min(max(interval, MIN_INTERVAL), MAX_INTERVAL)
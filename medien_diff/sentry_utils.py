@@ -1,8 +1,15 @@
 import sentry_sdk
 
 
-def tag_http_response(response):
+def tag_http_response(response, with_content=True):
     with sentry_sdk.configure_scope() as scope:
         scope.set_tag("status", response.status_code)
         scope.fingerprint = ["{{ default }}", response.status_code]
-        scope.set_extra("response_content", response.content)
+
+    if with_content:
+        tag_http_content(response.content)
+
+
+def tag_http_content(content):
+    with sentry_sdk.configure_scope() as scope:
+        scope.set_extra("response_content", content)
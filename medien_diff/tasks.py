@@ -1,40 +1,61 @@
-import re
 import io
 import logging
 import datetime
-import hashlib
 import urllib
 import functools
+import collections
+import concurrent.futures
 import random
-import tempfile
+import time
 
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-
-import flask
 import difflib
-import tweepy
-import simplediff
 
 import sentry_sdk
 
 import lxml.html
 import lxml.etree
 
+import flask
+import rq
 import requests
+import sqlalchemy
+import sqlalchemy.exc
 
-from medien_diff import QUEUES, redis_conn
+from medien_diff import QUEUES, shard_queue
 from medien_diff.models import db, Newspaper, ArticleRevision
-from medien_diff.html_utils import css, to_string
+from medien_diff.html_utils import css, to_string, stream_first_match
+from medien_diff.sentry_utils import tag_http_response, tag_http_content
+from medien_diff.render import render_diff
+from medien_diff.profiles import get_profile
+from medien_diff import persistence, inflight, frontpages, metrics, circuit, debounce
+from medien_diff import tweets, history
 from medien_diff.text import is_significant_title_change
-from medien_diff.sentry_utils import tag_http_response
-
-http_session = requests.session()
-requests.utils.add_dict_to_cookiejar(
-    http_session.cookies, {"DSGVO_ZUSAGE_V1": "true",}  # derstandard needs this
+from medien_diff.cleanup import delete_stale_articles
+from medien_diff.schedule import EXPIRE_AFTER, SEEN_RESOLUTION
+from medien_diff.http_utils import (
+    conditional_get,
+    store_validators,
+    forget_validators,
 )
 
 _ALL_LINKS_XPATH = css("a")
+_CANONICAL_XPATH = lxml.etree.XPath("//head/link[@rel='canonical']/@href")
+
+# Rows fetched from the DB and jobs enqueued at once by refresh_all
+_REFRESH_CHUNK_SIZE = 1000
+
+# Article titles tend to be within the first few chunks
+_STREAM_CHUNK_SIZE = 16 * 1024
+
+# Seconds to wait after Twitter said we sent too many tweets
+_RATE_LIMITED_DELAY = 15 * 60
+
+# Tries to tweet a change before giving up on it, and seconds between them
+_TWEET_ATTEMPTS = 5
+_TWEET_RETRY_DELAY = 5 * 60
+
+# Errors writing results that are no fault of the results themselves
+_DB_UNAVAILABLE = (sqlalchemy.exc.OperationalError, sqlalchemy.exc.InterfaceError)
 
 logger = logging.Logger(__name__)
 
@@ -43,60 +64,252 @@ class MissingData(Exception):
     pass
 
 
+class CircuitOpen(Exception):
+    pass
+
+
 def job(f):
     @functools.wraps(f)
     def inner(*args, **kwargs):
         from medien_diff import app
 
-        with app.app_context():
-            return f(*args, **kwargs)
+        labels = dict(job=f.__name__, queue=_current_queue())
+        try:
+            with app.app_context(), metrics.timer("job_seconds", **labels):
+                return f(*args, **kwargs)
+        except Exception:
+            metrics.incr("job_failures", **labels)
+            raise
+        finally:
+            metrics.flush()
 
     return inner
 
 
+def _current_queue():
+    job = rq.get_current_job()
+    return job.origin if job is not None else ""
+
+
+def _enqueue_many(jobs):
+    """
+    Enqueue `(queue, job data)` pairs, in one round trip per queue.
+    """
+
+    queues = {}
+    jobs_by_queue = collections.defaultdict(list)
+    for queue, data in jobs:
+        queues[queue.name] = queue
+        jobs_by_queue[queue.name].append(data)
+
+    for name, queue_jobs in jobs_by_queue.items():
+        with metrics.timer("enqueue_seconds", queue=name):
+            queues[name].enqueue_many(queue_jobs)
+        metrics.incr("jobs_enqueued", len(queue_jobs), queue=name)
+
+
 @job
 def refresh_all():
-    for paper in db.session.query(Newspaper).all():
-        QUEUES["main"].enqueue(fetch_newspaper_frontpage, newspaper_id=paper.id)
+    # Articles whose frontpage teaser is checked by the frontpage job anyway
+    on_frontpage = set()
 
     now = datetime.datetime.now()
 
-    articles = list(
-        db.session.query(ArticleRevision).filter(
-            ArticleRevision.fetched_at < now - datetime.timedelta(days=7)
+    # Rather than fetching articles only to delete them
+    with metrics.timer("db_seconds", op="cleanup"):
+        delete_stale_articles(now)
+        history.ensure_partitions(now)
+
+    papers = db.session.query(Newspaper).all()
+    # Sites that keep failing are left alone until their cooldown is over
+    skipped = circuit.open_circuits(paper.id for paper in papers)
+
+    for paper in papers:
+        if paper.id in skipped:
+            logger.info("newspaper.circuit_open", extra={"newspaper_id": paper.id})
+            continue
+
+        shard_queue("main", paper.id).enqueue(
+            fetch_newspaper_frontpage, newspaper_id=paper.id
         )
-    )
 
-    random.shuffle(articles)
+        if paper.teaser_title_css_selector:
+            _, links = frontpages.load(paper.id)
+            on_frontpage.update(
+                (paper.id, url)
+                for url, teaser_title in (links or {}).items()
+                if teaser_title
+            )
 
-    for article in articles:
-        QUEUES["slow"].enqueue(
-            fetch_newspaper_article,
-            newspaper_id=article.newspaper,
-            url=article.url,
-            delete_if_no_change=True,
-            delete_if_no_match_regex=True,
+    due_articles = db.session.query(
+        ArticleRevision.newspaper,
+        ArticleRevision.url,
+        sqlalchemy.func.coalesce(
+            ArticleRevision.seen_on_frontpage_at, ArticleRevision.changed_at
+        ),
+    ).filter(ArticleRevision.next_fetch_at <= now)
+    if skipped:
+        due_articles = due_articles.filter(
+            ArticleRevision.newspaper.notin_(list(skipped))
         )
 
+    for articles in _chunked(
+        due_articles.yield_per(_REFRESH_CHUNK_SIZE), _REFRESH_CHUNK_SIZE
+    ):
+        # Articles that dropped off the frontpage a while ago are deleted if
+        # they didn't change either
+        seen_at = {
+            (n, url): s for n, url, s in articles if (n, url) not in on_frontpage
+        }
+        articles = inflight.claim(seen_at)
+        expired = [a for a in articles if seen_at[a] < now - EXPIRE_AFTER]
+        fresh = [a for a in articles if seen_at[a] >= now - EXPIRE_AFTER]
+
+        jobs = _article_jobs("slow", expired, delete_if_no_change=True)
+        jobs += _article_jobs("slow", fresh)
+
+        # Spread load across newspapers sharing a queue
+        random.shuffle(jobs)
+        _enqueue_many(jobs)
+
+
+def _article_jobs(queue_name, articles, **kwargs):
+    """
+    Prepare jobs that fetch `(newspaper_id, url)` pairs, in batches of up to
+    `ARTICLE_FETCH_BATCH_SIZE` articles of the same newspaper. Returns
+    `(queue, job data)` pairs for `_enqueue_many`.
+    """
+
+    urls_by_newspaper = collections.defaultdict(list)
+    for newspaper_id, url in articles:
+        urls_by_newspaper[newspaper_id].append(url)
+
+    batch_size = flask.current_app.config["ARTICLE_FETCH_BATCH_SIZE"]
+    jobs = []
+    for newspaper_id, urls in urls_by_newspaper.items():
+        queue = shard_queue(queue_name, newspaper_id)
+        for batch in _chunked(urls, batch_size):
+            data = queue.prepare_data(
+                fetch_newspaper_articles,
+                kwargs=dict(newspaper_id=newspaper_id, urls=batch, **kwargs),
+            )
+            jobs.append((queue, data))
+
+    return jobs
+
+
+def _chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
 
 @job
 def fetch_newspaper_frontpage(newspaper_id):
     sentry_sdk.set_tag("newspaper_id", newspaper_id)
 
-    paper = db.session.query(Newspaper).get(newspaper_id)
+    if not circuit.allow(newspaper_id):
+        logger.info("frontpage.circuit_open")
+        metrics.incr("circuit_skipped", kind="frontpage")
+        return
 
-    article_url_pattern = re.compile(paper.article_url_pattern)
+    paper = get_profile(newspaper_id)
 
-    response = http_session.get(paper.base_url)
+    with metrics.timer("fetch_seconds", kind="frontpage"):
+        response = _get(paper, paper.base_url)
+    metrics.incr("http_responses", kind="frontpage", status=response.status_code)
+    metrics.incr("http_bytes", len(response.content), kind="frontpage")
     tag_http_response(response)
     response.raise_for_status()
 
-    tree = lxml.html.fromstring(response.text)
+    # If the page didn't change, the links from last time are still valid
+    stored_body, links = frontpages.load(newspaper_id)
+
+    if response.status_code == 304:
+        if links is None:
+            # Nothing to go on, get the whole page next time
+            forget_validators(paper.base_url)
+            return
+        logger.info("frontpage.not_modified")
+    else:
+        body = frontpages.body_fingerprint(paper, response.content)
+
+        if body == stored_body:
+            logger.info("frontpage.unchanged")
+        else:
+            with metrics.timer("parse_seconds", kind="frontpage"):
+                links = _article_links(paper, response)
+
+            if not links:
+                raise MissingData("frontpage.empty")
+
+            # Fetch articles from where they are now, and find their rows
+            with metrics.timer("db_seconds", op="resolve_aliases"):
+                links = persistence.resolve_aliases(links)
+
+            if not frontpages.store(newspaper_id, body, links):
+                logger.info("frontpage.links_unchanged")
+
+    now = datetime.datetime.now()
+    plan_due_at = frontpages.plan_due_at(newspaper_id)
+    if plan_due_at is not None and now < plan_due_at:
+        # Same links as last time, and none of their articles due yet
+        logger.info("frontpage.nothing_due")
+        metrics.incr("frontpages_not_planned")
+    else:
+        _plan_frontpage_articles(newspaper_id, links, now)
+
+    if response.status_code != 304:
+        store_validators(paper.base_url, response)
+
+
+def _plan_frontpage_articles(newspaper_id, links, now):
+    with metrics.timer("db_seconds", op="frontpage_articles"):
+        # Keeps the articles from expiring, see refresh_all
+        db.session.query(ArticleRevision).filter(
+            ArticleRevision.url.in_(links),
+            sqlalchemy.or_(
+                ArticleRevision.seen_on_frontpage_at.is_(None),
+                ArticleRevision.seen_on_frontpage_at < now - SEEN_RESOLUTION,
+            ),
+        ).update({"seen_on_frontpage_at": now}, synchronize_session=False)
+        db.session.commit()
+
+        rows = {
+            url: (title, next_fetch_at)
+            for url, title, next_fetch_at in db.session.query(
+                ArticleRevision.url,
+                ArticleRevision.title,
+                ArticleRevision.next_fetch_at,
+            ).filter(ArticleRevision.url.in_(links))
+        }
+    fetch, confirmed = frontpages.plan_fetches(links, rows, now)
+
+    # The teaser is as good as fetching the article
+    for url in confirmed:
+        _record_article_result(newspaper_id=newspaper_id, url=url, fetched_at=now)
+
+    # A previous refresh might still be working on some of them
+    articles = inflight.claim((newspaper_id, url) for url in fetch)
+
+    _enqueue_many(_article_jobs("main", articles))
+
+    frontpages.set_plan_due_at(
+        newspaper_id, frontpages.next_plan_at(rows, fetch, confirmed, now)
+    )
+
 
-    links = list(tree.xpath(_ALL_LINKS_XPATH))
-    found = False
+def _article_links(paper, response):
+    tree = lxml.html.fromstring(response.text)
+    links = {}
 
-    for link in links:
+    for link in tree.xpath(_ALL_LINKS_XPATH):
         href = link.attrib.get("href", "").strip()
         if not href:
             continue
@@ -105,146 +318,431 @@ def fetch_newspaper_frontpage(newspaper_id):
         href = href.split("?")[0]
         href = href.split("#")[0]
 
-        if article_url_pattern.match(href):
-            found = True
-            QUEUES["main"].enqueue(
-                fetch_newspaper_article, newspaper_id=newspaper_id, url=href
-            )
+        # Links often show up several times on one page, e.g. for the image
+        # and the headline. Keep whichever has a teaser title.
+        if paper.article_url_pattern.match(href) and links.get(href) is None:
+            links[href] = _teaser_title(paper, link)
+
+    return links
+
 
-    if not found:
-        raise MissingData("frontpage.empty")
+def _teaser_title(paper, link):
+    if paper.teaser_title_xpath is None:
+        return None
+
+    titles = paper.teaser_title_xpath(link)
+    if not titles:
+        return None
+
+    return to_string(titles).strip() or None
 
 
 @job
 def fetch_newspaper_article(
     newspaper_id, url, delete_if_no_change=False, delete_if_no_match_regex=False
 ):
+    try:
+        _fetch_article(
+            get_profile(newspaper_id),
+            url,
+            delete_if_no_change,
+            delete_if_no_match_regex,
+        )
+    except CircuitOpen:
+        logger.info("article.circuit_open")
+        metrics.incr("circuit_skipped", kind="article")
+    finally:
+        inflight.release(newspaper_id, url)
+
+
+@job
+def fetch_newspaper_articles(
+    newspaper_id, urls, delete_if_no_change=False, delete_if_no_match_regex=False
+):
+    """
+    Like `fetch_newspaper_article`, for many articles of one newspaper. Up to
+    `ARTICLE_FETCH_CONCURRENCY` requests are in flight at once. Failures are
+    reported to Sentry per article and don't affect the rest of the batch.
+    Once the newspaper's circuit opens, the remaining articles are skipped.
+    """
+
+    app = flask.current_app._get_current_object()
+    paper = get_profile(newspaper_id)
+    hub = sentry_sdk.Hub.current
+
+    def fetch(url):
+        # Each thread needs its own app context and Sentry scope
+        with app.app_context(), sentry_sdk.Hub(hub) as thread_hub:
+            try:
+                _fetch_article(
+                    paper, url, delete_if_no_change, delete_if_no_match_regex
+                )
+                return True
+            except CircuitOpen:
+                return None
+            except Exception:
+                thread_hub.capture_exception()
+                return False
+            finally:
+                inflight.release(newspaper_id, url)
+
+    with concurrent.futures.ThreadPoolExecutor(
+        app.config["ARTICLE_FETCH_CONCURRENCY"]
+    ) as executor:
+        results = list(executor.map(fetch, urls))
+
+    queue = _current_queue()
+    metrics.incr("articles", results.count(True), queue=queue, result="ok")
+    metrics.incr("articles", results.count(False), queue=queue, result="failed")
+    metrics.incr("circuit_skipped", results.count(None), kind="article")
+
+    if results.count(False) == len(results):
+        raise MissingData("articles.all_failed")
+
+
+def _fetch_article(paper, url, delete_if_no_change, delete_if_no_match_regex):
+    newspaper_id = paper.id
     sentry_sdk.set_tag("newspaper_id", newspaper_id)
     sentry_sdk.set_tag("url", url)
     now = datetime.datetime.now()
 
-    paper = db.session.query(Newspaper).get(newspaper_id)
-
-    if delete_if_no_match_regex and not re.compile(paper.article_url_pattern).match(
-        url
-    ):
-        db.session.query(ArticleRevision).filter(ArticleRevision.url == url).delete()
+    if delete_if_no_match_regex and not paper.article_url_pattern.match(url):
+        _record_article_result(newspaper_id=newspaper_id, url=url, delete=True)
         return
 
-    response = http_session.get(url)
-    tag_http_response(response)
+    if not circuit.allow(newspaper_id):
+        raise CircuitOpen(newspaper_id)
+
+    start = time.perf_counter()
+    response = _get(paper, url, stream=True)
+    metrics.incr("http_responses", kind="article", status=response.status_code)
+    tag_http_response(response, with_content=not response.ok)
     response.raise_for_status()
 
-    article = db.session.query(ArticleRevision).get(response.url)
-    if article is None:
-        article = db.session.query(ArticleRevision).get(url)
-        if article is not None:
-            article.url = response.url
+    if response.status_code == 304:
+        # Nothing to parse, the title can't have changed either
+        response.close()
+        title = canonical_url = None
+        metrics.observe("fetch_seconds", time.perf_counter() - start, kind="article")
     else:
-        db.session.query(ArticleRevision).filter(ArticleRevision.url == url).delete()
+        title, canonical_url = _extract_title(response, paper, start)
+
+    # The page knows best where it lives, unless it points somewhere unrelated
+    final_url = response.url
+    if canonical_url and paper.article_url_pattern.match(canonical_url):
+        final_url = canonical_url
+
+    _record_article_result(
+        newspaper_id=newspaper_id,
+        url=url,
+        final_url=final_url,
+        title=title,
+        fetched_at=now,
+        delete_if_no_change=delete_if_no_change,
+    )
 
-    tree = lxml.html.fromstring(response.text)
+    if title is not None:
+        store_validators(url, response)
+
+
+def _get(paper, url, **kwargs):
+    """
+    `conditional_get` for a page of `paper`, updating the newspaper's circuit
+    with the outcome.
+    """
+
+    try:
+        response = conditional_get(
+            url, max_requests_per_second=paper.max_requests_per_second, **kwargs
+        )
+    except requests.RequestException:
+        circuit.record_failure(paper.id)
+        raise
 
-    title_iter = list(tree.xpath(css(paper.article_title_css_selector)))
+    if circuit.is_failure(response):
+        circuit.record_failure(paper.id)
+    else:
+        circuit.record_success(paper.id)
+
+    return response
+
+
+def _record_article_result(**result):
+    pending = persistence.record_result(**result)
+    batch_size = flask.current_app.config["ARTICLE_BATCH_SIZE"]
+
+    if pending % batch_size == 0:
+        QUEUES["main"].enqueue(flush_article_results)
+    elif pending == 1:
+        # Make sure the first result of a batch doesn't wait forever
+        _schedule_flush()
+
+
+def _schedule_flush():
+    QUEUES["main"].enqueue_in(
+        datetime.timedelta(seconds=flask.current_app.config["ARTICLE_FLUSH_INTERVAL"]),
+        flush_article_results,
+    )
+
+
+@job
+def flush_article_results():
+    batch_size = flask.current_app.config["ARTICLE_BATCH_SIZE"]
+    raw_results = persistence.take_results(batch_size)
+    if not raw_results:
+        return 0
+
+    try:
+        with metrics.timer("db_seconds", op="write_results"):
+            changes, lost = persistence.write_results(raw_results)
+    except _DB_UNAVAILABLE:
+        db.session.rollback()
+        persistence.return_results(raw_results)
+        _schedule_flush()
+        raise
+    except Exception:
+        # Most likely a single bad result, which must not block all others
+        db.session.rollback()
+        changes, lost = _write_results_one_by_one(raw_results)
+
+    # Whatever is left must not wait for the next refresh
+    pending = persistence.pending_results()
+    if pending >= batch_size:
+        QUEUES["main"].enqueue(flush_article_results)
+    elif pending:
+        _schedule_flush()
+
+    # A title flipping back and forth would be tweeted again otherwise
+    for change, tweeted in zip(changes, debounce.seen(changes)):
+        if tweeted:
+            logger.info("tweet.duplicate")
+            continue
+
+        _schedule_tweet(*change)
+
+    # We got a 304 for those, but have nothing to compare against. Fetch them
+    # in full next time.
+    for url in lost:
+        forget_validators(url)
+
+    return len(raw_results)
+
+
+def _write_results_one_by_one(raw_results):
+    changes = []
+    lost = []
+
+    for i, raw in enumerate(raw_results):
+        try:
+            result_changes, result_lost = persistence.write_results([raw])
+        except _DB_UNAVAILABLE:
+            db.session.rollback()
+            persistence.return_results(raw_results[i:])
+            _schedule_flush()
+            raise
+        except Exception:
+            db.session.rollback()
+            sentry_sdk.capture_exception()
+            logger.warning("article.write_failed")
+            metrics.incr("article_results_failed")
+            persistence.bury_result(raw)
+            continue
 
-    if len(title_iter) < 1:
+        changes.extend(result_changes)
+        lost.extend(result_lost)
+
+    return changes, lost
+
+
+def _extract_title(response, paper, start):
+    """
+    Parse the title and the canonical URL (or None) out of the streamed
+    `response`, recording how long it took to download the page (since
+    `start`) and to parse it.
+    """
+
+    matcher = paper.article_title_matcher
+
+    if matcher is None:
+        tag_http_content(response.content)
+        metrics.observe("fetch_seconds", time.perf_counter() - start, kind="article")
+        metrics.incr("http_bytes", len(response.content), kind="article")
+
+        with metrics.timer("parse_seconds", kind="article"):
+            tree = lxml.html.fromstring(response.text)
+            title_iter = list(paper.article_title_xpath(tree))
+
+        if len(title_iter) < 1:
+            raise MissingData("article.title.zero")
+        elif len(title_iter) != 1:
+            logger.error("article.title.not_one", extra={"titles": title_iter})
+
+        return to_string(title_iter[0]), _canonical_url(tree, response)
+
+    received = []
+    # Downloading and parsing are interleaved, keep track of the time spent
+    # waiting for chunks.
+    header_seconds = time.perf_counter() - start
+    download_seconds = 0
+
+    def chunks():
+        nonlocal download_seconds
+        chunk_iter = response.iter_content(_STREAM_CHUNK_SIZE)
+        while True:
+            chunk_start = time.perf_counter()
+            chunk = next(chunk_iter, None)
+            download_seconds += time.perf_counter() - chunk_start
+            if chunk is None:
+                return
+            received.append(chunk)
+            yield chunk
+
+    parse_start = time.perf_counter()
+    try:
+        title = stream_first_match(chunks(), matcher, encoding=response.encoding)
+    finally:
+        # Don't download the rest of the article
+        response.close()
+
+        parse_seconds = time.perf_counter() - parse_start - download_seconds
+        metrics.observe(
+            "fetch_seconds", header_seconds + download_seconds, kind="article"
+        )
+        metrics.observe("parse_seconds", parse_seconds, kind="article")
+        metrics.incr("http_bytes", sum(map(len, received)), kind="article")
+
+    if title is None:
+        tag_http_content(b"".join(received))
         raise MissingData("article.title.zero")
-    elif len(title_iter) != 1:
-        logger.error("article.title.not_one", extra={"titles": title_iter})
 
-    title = to_string(title_iter[0])
+    # Usually in <head>, which is parsed by the time we got to the title
+    return to_string(title), _canonical_url(title.getroottree(), response)
+
+
+def _canonical_url(tree, response):
+    hrefs = _CANONICAL_XPATH(tree)
+    if not hrefs or not hrefs[0].strip():
+        return None
+
+    return urllib.parse.urljoin(response.url, hrefs[0].strip())
+
+
+def _schedule_tweet(newspaper_id, url, old, new):
+    # Further changes to the article until the job runs go into the same tweet
+    if not tweets.add_change(newspaper_id, url, old, new):
+        logger.info("tweet.coalesced")
+        metrics.incr("tweets_coalesced")
+        return
 
-    if article is None:
-        article = ArticleRevision(
-            newspaper=newspaper_id,
+    delay = flask.current_app.config["TWEET_COALESCE_SECONDS"]
+    if delay:
+        QUEUES["twitter"].enqueue_in(
+            datetime.timedelta(seconds=delay),
+            tweet_pending,
+            newspaper_id=newspaper_id,
             url=url,
-            title=title,
-            fetched_at=now,
-            changed_at=now,
         )
-        db.session.add(article)
     else:
-        assert article.newspaper == newspaper_id
-        changed = False
+        QUEUES["twitter"].enqueue(tweet_pending, newspaper_id=newspaper_id, url=url)
+
+
+def _defer_tweet(newspaper_id, url, seconds, attempt=1):
+    logger.info("tweet.deferred", extra={"seconds": seconds})
+    metrics.incr("tweets_deferred")
+    QUEUES["twitter"].enqueue_in(
+        datetime.timedelta(seconds=seconds),
+        tweet_pending,
+        newspaper_id=newspaper_id,
+        url=url,
+        attempt=attempt,
+    )
 
-        if is_significant_title_change(article.title, title):
-            QUEUES["twitter"].enqueue(
-                tweet, newspaper_id=newspaper_id, url=url, old=article.title, new=title
-            )
-            article.title = title
-            changed = True
 
-        article.fetched_at = now
+@job
+def tweet_pending(newspaper_id, url, attempt=1):
+    """
+    Tweet the pending change of an article (see `medien_diff.tweets`), or try
+    again later if the account is out of tweets or tweeting failed.
+    """
 
-        if changed:
-            article.changed_at = now
+    paper = get_profile(newspaper_id)
 
-        if not changed and delete_if_no_change:
-            db.session.delete(article)
+    change = tweets.pop_change(newspaper_id, url)
+    if change is None or not paper.has_twitter_credentials:
+        return
 
-    db.session.commit()
+    old, new = change
+    if not is_significant_title_change(old, new):
+        # e.g. a typo that was fixed again
+        logger.info("tweet.reverted")
+        return
+
+    if debounce.seen([(newspaper_id, url, old, new)])[0]:
+        logger.error("tweet.duplicate")
+        return
+
+    # Only now, so that changes not tweeted after all don't use up the budget
+    wait = tweets.take_budget(paper.twitter_access_token_key)
+    if wait:
+        tweets.restore_change(newspaper_id, url, old, new)
+        _defer_tweet(newspaper_id, url, wait, attempt)
+        return
+
+    try:
+        tweet(newspaper_id, url, old, new)
+    except Exception as e:
+        response = getattr(e, "response", None)
+        if getattr(response, "status_code", None) == 429:
+            # Our budget is off, e.g. because of tweets sent by someone else
+            tweets.restore_change(newspaper_id, url, old, new)
+            _defer_tweet(newspaper_id, url, _RATE_LIMITED_DELAY, attempt)
+            return
+
+        # A pending change gets no job of its own once restored, see
+        # `tweets.add_change`, so schedule the retry here
+        if attempt < _TWEET_ATTEMPTS:
+            tweets.restore_change(newspaper_id, url, old, new)
+            _defer_tweet(newspaper_id, url, _TWEET_RETRY_DELAY, attempt + 1)
+        else:
+            logger.error("tweet.given_up")
+        raise
 
 
 @job
 def tweet(newspaper_id, url, old, new):
-    paper = db.session.query(Newspaper).get(newspaper_id)
+    paper = get_profile(newspaper_id)
 
-    if (
-        not paper.twitter_consumer_key
-        or not paper.twitter_consumer_secret
-        or not paper.twitter_access_token_key
-        or not paper.twitter_access_token_secret
-    ):
+    if not paper.has_twitter_credentials:
         return
 
     # Defend against broken db entries
-    hasher = hashlib.sha256()
-    hasher.update(str(newspaper_id).encode("ascii"))
-    hasher.update(b":")
-    hasher.update(url.encode("utf8"))
-    hasher.update(b":")
-    hasher.update(old.encode("utf8"))
-    hasher.update(b":")
-    hasher.update(new.encode("utf8"))
-    debounce_key = hasher.hexdigest()
-
-    if redis_conn.get(debounce_key):
+    if not debounce.claim(newspaper_id, url, old, new):
         logger.error("tweet.duplicate")
         return
 
-    redis_conn.set(debounce_key, b"1")
+    try:
+        _send_tweet(paper, url, old, new)
+    except Exception:
+        # So that it can be retried
+        debounce.release(newspaper_id, url, old, new)
+        raise
 
-    html_ctx = tempfile.NamedTemporaryFile(suffix=".html")
-    png_ctx = tempfile.NamedTemporaryFile(suffix=".png")
 
-    with html_ctx as f, png_ctx as png:
-        f.write(b'<meta charset="utf-8">')
-        f.write(
-            '<link rel="stylesheet" href="file://{css_path}/diff.css">'.format(
-                css_path=flask.current_app.static_folder
-            ).encode("utf8")
-        )
-        f.write(b"<body><p>")
-        f.write(simplediff.html_diff(old, new).encode("utf8"))
-        f.write(b"</p></body>")
-        f.flush()
-
-        chrome_options = Options()
-        chrome_options.add_argument("--headless")
-        driver = webdriver.Chrome(chrome_options=chrome_options)
-        driver.get("file://{}".format(f.name))
-        driver.find_element_by_tag_name("p").screenshot(png.name)
-
-        auth = tweepy.OAuthHandler(
-            paper.twitter_consumer_key, paper.twitter_consumer_secret
-        )
-        auth.set_access_token(
-            paper.twitter_access_token_key, paper.twitter_access_token_secret
-        )
-        api = tweepy.API(auth)
+def _send_tweet(paper, url, old, new):
+    import tweepy
+
+    png = render_diff(old, new)
+
+    auth = tweepy.OAuthHandler(
+        paper.twitter_consumer_key, paper.twitter_consumer_secret
+    )
+    auth.set_access_token(
+        paper.twitter_access_token_key, paper.twitter_access_token_secret
+    )
+    api = tweepy.API(auth)
 
-        # Passing a fileobject into tweepy actually does not work, despite what the
-        # documentation suggests.
-        media_id = api.media_upload(png.name).media_id_string
+    # tweepy derives the upload's content type from the filename alone, which
+    # therefore has to end in .png
+    media_id = api.media_upload("diff.png", file=io.BytesIO(png)).media_id_string
 
     api.update_status(status=url, media_ids=[media_id])
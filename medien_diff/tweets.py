@@ -0,0 +1,91 @@
+"""
+Changes waiting to be tweeted, and how many tweets each Twitter account has
+left. Several changes to one article are collected into one pending change
+from the first old title to the latest one, see `tasks.tweet_pending`.
+"""
+
+import time
+import hashlib
+
+from medien_diff import app, redis_conn
+
+# Pending changes whose job got lost are forgotten eventually
+_PENDING_TTL = 60 * 60 * 24
+
+
+def _pending_key(newspaper_id, url):
+    return "medien_diff:pending_tweet:{}:{}".format(
+        newspaper_id, hashlib.sha256(url.encode("utf8")).hexdigest()
+    )
+
+
+def add_change(newspaper_id, url, old, new):
+    """
+    Add a title change to the article's pending change. Returns True if there
+    was none yet, i.e. a job has to be scheduled for it.
+    """
+
+    key = _pending_key(newspaper_id, url)
+    pipe = redis_conn.pipeline()
+    pipe.hsetnx(key, "old", old)
+    pipe.hset(key, "new", new)
+    pipe.expire(key, _PENDING_TTL)
+    created, _, _ = pipe.execute()
+    return bool(created)
+
+
+def pop_change(newspaper_id, url):
+    """
+    Remove the article's pending change and return it as `(old, new)`, or None
+    if there is none.
+    """
+
+    key = _pending_key(newspaper_id, url)
+    pipe = redis_conn.pipeline()
+    pipe.hmget(key, "old", "new")
+    pipe.delete(key)
+    (old, new), _ = pipe.execute()
+
+    if old is None or new is None:
+        return None
+
+    return old.decode("utf8"), new.decode("utf8")
+
+
+def restore_change(newspaper_id, url, old, new):
+    """
+    Put back a change taken by `pop_change`, merging it with any change that
+    came in since then.
+    """
+
+    key = _pending_key(newspaper_id, url)
+    pipe = redis_conn.pipeline()
+    pipe.hset(key, "old", old)
+    pipe.hsetnx(key, "new", new)
+    pipe.expire(key, _PENDING_TTL)
+    pipe.execute()
+
+
+def take_budget(account):
+    """
+    Use up one tweet of `account`'s budget of `TWEET_RATE_LIMIT` tweets per
+    `TWEET_RATE_LIMIT_WINDOW` seconds. Returns 0 if there was some left,
+    otherwise the number of seconds until there is again.
+    """
+
+    window = app.config["TWEET_RATE_LIMIT_WINDOW"]
+    now = time.time()
+    bucket = int(now // window)
+
+    key = "medien_diff:tweet_budget:{}:{}".format(
+        hashlib.sha256(account.encode("utf8")).hexdigest(), bucket
+    )
+    pipe = redis_conn.pipeline(transaction=False)
+    pipe.incr(key)
+    pipe.expire(key, window)
+    used, _ = pipe.execute()
+
+    if used <= app.config["TWEET_RATE_LIMIT"]:
+        return 0
+
+    return (bucket + 1) * window - now
@@ -0,0 +1,249 @@
+"""
+The web app and CLI: `FLASK_APP=medien_diff.web:app`. Workers only need
+`medien_diff`, see `medien_diff.worker`.
+"""
+
+import datetime
+
+import click
+import flask
+from flask_migrate import Migrate
+import flask_admin
+import flask_admin.contrib.sqla
+from flask_admin.form import rules
+import rq_dashboard.web
+
+from medien_diff import app, db, redis_conn, QUEUES, redis_queue_main, worker_queues
+from medien_diff import metrics, feed, history, persistence
+from medien_diff.models import Newspaper, ArticleRevision
+
+# `flask db`
+migrate = Migrate(app, db)
+
+# VIEWS
+_NEWSPAPER_FORM_RULES = (
+    rules.HTML("<p>Name of the newspaper. For example: <code>Der Standard</code>"),
+    "name",
+    rules.HTML(
+        "<p>URL of the frontpage or some other page where all the articles are linked. For example: <code>https://www.derstandard.at/frontpage/latest</code>"
+    ),
+    "base_url",
+    rules.HTML(
+        "<p>Regex that matches against article URLs. For example: <code>^https://www.derstandard.at/story/</code>"
+    ),
+    "article_url_pattern",
+    rules.HTML(
+        "<p>CSS selector that matches the title text when viewing the article page. For example: <code>.article-title</code>"
+    ),
+    "article_title_css_selector",
+    rules.HTML(
+        "<p>Optional CSS selector that matches the title text within an article link on the frontpage. Articles are then only fetched when that title changes. Only use this if the frontpage shows the same headline as the article page. For example: <code>h2</code>"
+    ),
+    "teaser_title_css_selector",
+    rules.HTML(
+        "<p>How many requests per second all workers together may send to the newspaper's servers. Leave empty for no limit. For example: <code>2</code>"
+    ),
+    "max_requests_per_second",
+    rules.HTML(
+        "<p>Twitter credentials to use to post to Twitter. Consumer = Twitter app, Access token = Login into an account. Use <code>make twitter</code> to generate the latter."
+    ),
+    "twitter_consumer_key",
+    "twitter_consumer_secret",
+    "twitter_access_token_key",
+    "twitter_access_token_secret",
+)
+
+
+class ModelView(flask_admin.contrib.sqla.ModelView):
+    def __init__(
+        self,
+        model,
+        *args,
+        with_primary_key=False,
+        form_rules=None,
+        simple_list_pager=False,
+        **kwargs
+    ):
+        # Without a page count, which needs a COUNT(*) of the whole table
+        self.simple_list_pager = simple_list_pager
+
+        if with_primary_key:
+            self.column_list = [c.key for c in model.__table__.columns]
+            self.form_columns = self.column_list
+
+        if form_rules is not None:
+            self.form_create_rules = self.form_edit_rules = form_rules
+
+        super(ModelView, self).__init__(model, *args, **kwargs)
+
+
+admin = flask_admin.Admin(app)
+admin.add_view(ModelView(Newspaper, db.session, form_rules=_NEWSPAPER_FORM_RULES))
+admin.add_view(
+    ModelView(
+        ArticleRevision, db.session, with_primary_key=True, simple_list_pager=True
+    )
+)
+
+app.register_blueprint(rq_dashboard.web.blueprint, url_prefix="/queues")
+app.register_blueprint(feed.blueprint)
+
+
+@app.route("/")
+def index():
+    return flask.render_template("index.html")
+
+
+@app.route("/metrics")
+def prometheus_metrics():
+    return flask.Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.cli.command()
+@click.option("--run-worker/--no-run-worker", default=True)
+@click.option(
+    "--workers",
+    type=int,
+    default=0,
+    help="Number of worker processes for the main and slow queues and shards. "
+    "By default, all jobs run in this process.",
+)
+@click.option(
+    "--twitter-workers",
+    type=int,
+    default=1,
+    help="Number of worker processes for tweets, with --workers.",
+)
+def refresh(run_worker, workers, twitter_workers):
+    from medien_diff.tasks import refresh_all, flush_article_results
+    from medien_diff.worker import enqueue_due_jobs
+
+    redis_queue_main.enqueue(refresh_all)
+
+    if run_worker:
+        # e.g. tweets held back by an earlier run
+        enqueue_due_jobs(worker_queues() + [QUEUES["twitter"]])
+
+    if run_worker and workers:
+        from medien_diff.pool import WorkerPool
+
+        pool = WorkerPool(
+            [worker_queues()] * workers + [[QUEUES["twitter"]]] * twitter_workers
+        )
+
+        # Like below, with a round of the pool instead of a burst
+        while pool.run() and flush_article_results():
+            pass
+
+    elif run_worker:
+        from medien_diff.worker import RoundRobinSimpleWorker
+
+        worker = RoundRobinSimpleWorker(
+            worker_queues() + [QUEUES["twitter"]], connection=redis_conn
+        )
+        worker.work(burst=True)
+
+        # Flush the last partial batch instead of waiting for the scheduler,
+        # which may enqueue further jobs.
+        while flush_article_results():
+            worker.work(burst=True)
+
+
+@app.cli.command("forget-old-tweets")
+def forget_old_tweets():
+    """
+    Delete the keys tweets were debounced with before medien_diff.debounce,
+    which never expire.
+    """
+
+    deleted = 0
+    batch = []
+    for key in redis_conn.scan_iter(match="[0-9a-f]" * 64, count=1000):
+        batch.append(key)
+        if len(batch) >= 1000:
+            deleted += redis_conn.delete(*batch)
+            batch = []
+
+    if batch:
+        deleted += redis_conn.delete(*batch)
+
+    click.echo("Deleted {} keys".format(deleted))
+
+
+@app.cli.command("retry-article-results")
+def retry_article_results():
+    """
+    Try writing article results again that failed before.
+    """
+
+    from medien_diff.tasks import flush_article_results
+
+    click.echo("Retrying {} results".format(persistence.retry_failed_results()))
+    redis_queue_main.enqueue(flush_article_results)
+
+
+@app.cli.command("drop-title-history")
+@click.option("--months", type=int, default=12, help="Months of history to keep.")
+def drop_title_history(months):
+    """
+    Delete the title history of all but the last few months.
+    """
+
+    now = datetime.datetime.now()
+    before = datetime.datetime(now.year, now.month, 1)
+    for _ in range(months - 1):
+        before = (before - datetime.timedelta(days=1)).replace(day=1)
+
+    for name in history.drop_partitions(before):
+        click.echo("Dropped {}".format(name))
+
+
+@app.cli.command("change-counts")
+@click.option("--days", type=int, default=7)
+def change_counts(days):
+    """
+    Show how many articles of each newspaper got a new title in the last few
+    days, according to the title history.
+    """
+
+    names = dict(db.session.query(Newspaper.id, Newspaper.name))
+    counts = history.change_counts(
+        datetime.datetime.now() - datetime.timedelta(days=days)
+    )
+    for newspaper_id, (articles, changes) in sorted(counts.items()):
+        click.echo(
+            "{}: {} articles, {} significant changes ({:.1f} per day)".format(
+                names.get(newspaper_id, newspaper_id), articles, changes, changes / days
+            )
+        )
+
+
+@app.cli.command()
+def twitter():
+    import tweepy
+
+    paper = db.session.query(Newspaper).get(int(click.prompt("ID of newspaper")))
+    if (
+        paper.twitter_consumer_key
+        or paper.twitter_consumer_secret
+        or paper.twitter_access_token_key
+        or paper.twitter_access_token_secret
+    ):
+        click.echo("Credentials already exist, clear them out first!")
+        click.exit(1)
+
+    consumer_key = click.prompt("Consumer key")
+    consumer_secret = click.prompt("Consumer secret")
+
+    auth = tweepy.OAuthHandler(consumer_key, consumer_secret)
+
+    click.echo("Go to {}".format(auth.get_authorization_url()))
+
+    access_token_key, access_token_secret = auth.get_access_token(
+        click.prompt("Verification code")
+    )
+    paper.twitter_consumer_key = consumer_key
+    paper.twitter_consumer_secret = consumer_secret
+    paper.twitter_access_token_key = access_token_key
+    paper.twitter_access_token_secret = access_token_secret
+    db.session.commit()
@@ -0,0 +1,90 @@
+"""
+Workers for fetching:
+
+    python -m medien_diff.worker [--shards 0,3] [--burst]
+
+This is also the settings module for `rq worker -c medien_diff.worker`, which
+runs the Twitter worker.
+
+Importing the jobs here means the worker does it once at startup. Otherwise
+every forked work horse would import them again for its job.
+"""
+
+import argparse
+
+import rq
+from rq.scheduler import RQScheduler
+from rq.logutils import setup_loghandlers
+
+from medien_diff import REDIS_URL, SHARDS, redis_conn, worker_queues
+import medien_diff.tasks
+
+
+class _ShardRotation(object):
+    """
+    Take turns between the shards of a queue so that no newspaper is starved
+    by a busy one. Unlike `rq.worker.RoundRobinWorker`, all main queues still
+    go before the slow ones.
+    """
+
+    def reorder_queues(self, reference_queue):
+        shards = next(
+            (shards for shards in SHARDS.values() if reference_queue in shards), None
+        )
+        if shards is None:
+            return
+
+        positions = [
+            i for i, queue in enumerate(self._ordered_queues) if queue in shards
+        ]
+        current = [self._ordered_queues[i] for i in positions]
+        pos = current.index(reference_queue)
+        for i, queue in zip(positions, current[pos + 1 :] + current[: pos + 1]):
+            self._ordered_queues[i] = queue
+
+
+class RoundRobinWorker(_ShardRotation, rq.Worker):
+    pass
+
+
+class RoundRobinSimpleWorker(_ShardRotation, rq.SimpleWorker):
+    pass
+
+
+def enqueue_due_jobs(queues):
+    """
+    Enqueue jobs that were scheduled on `queues` for now or earlier, like the
+    scheduler of a burst worker does.
+    """
+
+    scheduler = RQScheduler(queues, connection=redis_conn)
+    scheduler.acquire_locks()
+    scheduler.enqueue_scheduled_jobs()
+    scheduler.release_locks()
+
+
+def _shard_list(value):
+    return {int(shard) for shard in value.split(",")}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Work on the main queue and the main and slow queue shards."
+    )
+    parser.add_argument(
+        "--shards",
+        type=_shard_list,
+        help="Comma-separated numbers of the shards to work on, all by default.",
+    )
+    parser.add_argument(
+        "--burst", action="store_true", help="Exit once the queues are empty."
+    )
+    args = parser.parse_args()
+
+    setup_loghandlers("INFO")
+    worker = RoundRobinWorker(worker_queues(args.shards), connection=redis_conn)
+    worker.work(burst=args.burst, with_scheduler=True)
+
+
+if __name__ == "__main__":
+    main()
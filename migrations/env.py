@@ -1,5 +1,6 @@
 from __future__ import with_statement
 
+import re
 import logging
 from logging.config import fileConfig
 
@@ -29,6 +30,15 @@ config.set_main_option(
 )
 target_metadata = current_app.extensions["migrate"].db.metadata
 
+# Partitions of the title history are managed by medien_diff.history, not by
+# migrations
+_PARTITION_RE = re.compile(r"^title_revision_(default|\d{4}_\d{2})$")
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    return not (type_ == "table" and reflected and _PARTITION_RE.match(name))
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -83,6 +93,7 @@ def run_migrations_online():
             connection=connection,
             target_metadata=target_metadata,
             process_revision_directives=process_revision_directives,
+            include_object=include_object,
             **current_app.extensions["migrate"].configure_args
         )
 
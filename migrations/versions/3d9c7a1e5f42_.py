@@ -0,0 +1,57 @@
+"""Title history
+
+Revision ID: 3d9c7a1e5f42
+Revises: 5e8a2f4c1b90
+Create Date: 2026-10-18 13:02:37.415820
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "3d9c7a1e5f42"
+down_revision = "5e8a2f4c1b90"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "title",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("digest", sa.LargeBinary(), nullable=False),
+        sa.Column("text", sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("digest"),
+    )
+    op.create_table(
+        "title_revision",
+        sa.Column("url", sa.String(), nullable=False),
+        sa.Column("seen_at", sa.DateTime(), nullable=False),
+        sa.Column("newspaper", sa.Integer(), nullable=False),
+        sa.Column("title_id", sa.Integer(), nullable=False),
+        sa.Column("significant", sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(["title_id"], ["title.id"]),
+        sa.PrimaryKeyConstraint("url", "seen_at"),
+        postgresql_partition_by="RANGE (seen_at)",
+    )
+    op.create_index(
+        "ix_title_revision_newspaper_seen_at",
+        "title_revision",
+        ["newspaper", "seen_at"],
+        unique=False,
+    )
+
+    # Monthly partitions are created by medien_diff.history.ensure_partitions
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(
+            "CREATE TABLE title_revision_default PARTITION OF title_revision DEFAULT"
+        )
+
+
+def downgrade():
+    op.drop_index("ix_title_revision_newspaper_seen_at", table_name="title_revision")
+    # Drops all partitions along with it
+    op.drop_table("title_revision")
+    op.drop_table("title")
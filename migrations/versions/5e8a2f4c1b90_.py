@@ -0,0 +1,57 @@
+"""Indexes for the change feed
+
+Revision ID: 5e8a2f4c1b90
+Revises: 9b1f3c6e2d7a
+Create Date: 2026-10-18 12:24:51.702113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "5e8a2f4c1b90"
+down_revision = "9b1f3c6e2d7a"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "ix_article_revision_changed_at_url",
+        "article_revision",
+        ["changed_at", "url"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_article_revision_newspaper_changed_at_url",
+        "article_revision",
+        ["newspaper", "changed_at", "url"],
+        unique=False,
+    )
+    op.drop_index(op.f("ix_article_revision_changed_at"), table_name="article_revision")
+
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index(
+        "ix_article_revision_title_trgm",
+        "article_revision",
+        ["title"],
+        unique=False,
+        postgresql_using="gin",
+        postgresql_ops={"title": "gin_trgm_ops"},
+    )
+
+
+def downgrade():
+    op.drop_index("ix_article_revision_title_trgm", table_name="article_revision")
+    op.create_index(
+        op.f("ix_article_revision_changed_at"),
+        "article_revision",
+        ["changed_at"],
+        unique=False,
+    )
+    op.drop_index(
+        "ix_article_revision_newspaper_changed_at_url", table_name="article_revision"
+    )
+    op.drop_index("ix_article_revision_changed_at_url", table_name="article_revision")
@@ -0,0 +1,31 @@
+"""Remember when articles were last linked from their frontpage
+
+Revision ID: 8f2d4b6a9c31
+Revises: 3d9c7a1e5f42
+Create Date: 2026-10-18 14:10:42.518306
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "8f2d4b6a9c31"
+down_revision = "3d9c7a1e5f42"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "article_revision",
+        sa.Column("seen_on_frontpage_at", sa.DateTime(), nullable=True),
+    )
+
+    # Articles still on their frontpage are bumped by its next fetch, the
+    # others keep a week from when they were last fetched
+    op.execute("UPDATE article_revision SET seen_on_frontpage_at = fetched_at")
+
+
+def downgrade():
+    op.drop_column("article_revision", "seen_on_frontpage_at")
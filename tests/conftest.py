@@ -0,0 +1,72 @@
+import io
+import sys
+
+import fakeredis
+import pytest
+import requests
+
+import medien_diff
+
+# Imported here so that they are patched even if no test module imports them
+from medien_diff import circuit, debounce, frontpages, inflight, metrics
+from medien_diff import persistence, profiles, tweets, http_utils
+
+
+@pytest.fixture(autouse=True)
+def redis_conn(monkeypatch):
+    """
+    One fake Redis for every module and queue, so no test talks to a real
+    one.
+    """
+
+    conn = fakeredis.FakeStrictRedis()
+
+    for name, module in list(sys.modules.items()):
+        if name.split(".")[0] == "medien_diff" and hasattr(module, "redis_conn"):
+            monkeypatch.setattr(module, "redis_conn", conn)
+
+    for queue in medien_diff.ALL_QUEUES.values():
+        monkeypatch.setattr(queue, "connection", conn)
+
+    return conn
+
+
+class StubSession(object):
+    """
+    Stands in for `http_utils.http_session`: answers requests from `pages`
+    (URL -> `(status, headers, body)` or an exception to raise) and remembers
+    their URLs and headers, and the other arguments of the last one. URLs in
+    `redirects` are answered as if redirected to the URL they map to.
+    """
+
+    def __init__(self):
+        self.pages = {}
+        self.redirects = {}
+        self.requests = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.requests.append((url, headers))
+        self.kwargs = kwargs
+        if isinstance(self.pages[url], Exception):
+            raise self.pages[url]
+
+        status, response_headers, body = self.pages[url]
+        return self.make_response(
+            self.redirects.get(url, url), status, body, response_headers
+        )
+
+    @staticmethod
+    def make_response(url, status, body=b"", headers=None):
+        response = requests.Response()
+        response.url = url
+        response.status_code = status
+        response.headers.update(headers or {})
+        response.raw = io.BytesIO(body)
+        return response
+
+
+@pytest.fixture
+def http_session(monkeypatch):
+    session = StubSession()
+    monkeypatch.setattr(http_utils, "http_session", session)
+    return session
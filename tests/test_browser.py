@@ -0,0 +1,73 @@
+import pytest
+
+from medien_diff import browser
+from medien_diff.browser import BrowserPool
+
+
+class FakeDriver(object):
+    def __init__(self):
+        self.healthy = True
+        self.quit_called = False
+
+    def execute_script(self, script):
+        if not self.healthy:
+            raise RuntimeError("chrome crashed")
+        return 1
+
+    def quit(self):
+        self.quit_called = True
+
+
+def test_reuse_and_recycle():
+    pool = BrowserPool(size=1, max_renders=2, factory=FakeDriver)
+
+    with pool.browser() as first:
+        pass
+    with pool.browser() as second:
+        pass
+    with pool.browser() as third:
+        pass
+
+    assert first is second
+    assert first.quit_called
+    assert third is not first
+
+
+def test_unhealthy_browser_is_replaced():
+    pool = BrowserPool(factory=FakeDriver)
+
+    with pool.browser() as first:
+        pass
+    first.healthy = False
+    with pool.browser() as second:
+        pass
+
+    assert first.quit_called
+    assert second is not first
+
+
+def test_failed_render_discards_browser():
+    pool = BrowserPool(factory=FakeDriver)
+
+    with pytest.raises(ValueError):
+        with pool.browser() as first:
+            raise ValueError()
+
+    assert first.quit_called
+
+    pool.close()
+    with pytest.raises(RuntimeError):
+        with pool.browser():
+            pass
+
+
+def test_close_browser_pool(monkeypatch):
+    pool = BrowserPool(factory=FakeDriver)
+    monkeypatch.setattr(browser, "_pool", pool)
+
+    with pool.browser() as driver:
+        pass
+
+    browser.close_browser_pool()
+    assert driver.quit_called
+    assert browser._pool is None
@@ -0,0 +1,66 @@
+import collections
+
+import pytest
+
+from medien_diff import app, circuit, metrics
+
+
+@pytest.fixture(autouse=True)
+def config(monkeypatch):
+    monkeypatch.setitem(app.config, "CIRCUIT_FAILURE_THRESHOLD", 3)
+    monkeypatch.setattr(metrics, "_counters", collections.Counter())
+
+
+def _expire_cooldown(redis_conn, newspaper_id):
+    redis_conn.delete(circuit._key("open", newspaper_id))
+
+
+def test_opens_after_consecutive_failures():
+    circuit.record_failure(1)
+    circuit.record_failure(1)
+    circuit.record_success(1)
+    circuit.record_failure(1)
+    circuit.record_failure(1)
+    assert circuit.allow(1)
+    assert not circuit.open_circuits([1, 2])
+
+    circuit.record_failure(1)
+    assert not circuit.allow(1)
+    assert circuit.allow(2)
+    assert circuit.open_circuits([1, 2]) == {1}
+
+
+def test_single_probe_after_cooldown(redis_conn):
+    for _ in range(3):
+        circuit.record_failure(1)
+
+    _expire_cooldown(redis_conn, 1)
+    assert not circuit.open_circuits([1])
+    assert circuit.allow(1)
+    assert not circuit.allow(1)
+
+    circuit.record_success(1)
+    assert circuit.allow(1)
+    assert circuit.allow(1)
+
+
+def test_failed_probe_reopens(redis_conn):
+    for _ in range(3):
+        circuit.record_failure(1)
+
+    _expire_cooldown(redis_conn, 1)
+    assert circuit.allow(1)
+    circuit.record_failure(1)
+    assert not circuit.allow(1)
+    assert circuit.open_circuits([1]) == {1}
+
+
+def test_is_failure():
+    class Response:
+        def __init__(self, status_code):
+            self.status_code = status_code
+
+    assert circuit.is_failure(Response(503))
+    assert circuit.is_failure(Response(403))
+    assert not circuit.is_failure(Response(404))
+    assert not circuit.is_failure(Response(304))
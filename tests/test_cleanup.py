@@ -0,0 +1,171 @@
+import datetime
+import collections
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from medien_diff import app, db, cleanup, metrics
+from medien_diff.models import Newspaper, ArticleRevision, UrlAlias
+
+NOW = datetime.datetime(2020, 7, 1, 12)
+DUE = NOW - datetime.timedelta(hours=1)
+NOT_DUE = NOW + datetime.timedelta(hours=1)
+
+
+@pytest.fixture(autouse=True)
+def database(monkeypatch):
+    monkeypatch.setattr(metrics, "_counters", collections.Counter())
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(
+            Newspaper(
+                id=1,
+                name="Der Standard",
+                base_url="https://www.derstandard.at/",
+                article_url_pattern=r"https://www\.derstandard\.at/story/\d+\b",
+                article_title_css_selector="h1",
+            )
+        )
+        db.session.commit()
+
+        yield
+
+        db.session.remove()
+        db.drop_all()
+
+
+def _add_article(url, newspaper=1, next_fetch_at=DUE):
+    db.session.add(
+        ArticleRevision(
+            newspaper=newspaper,
+            url=url,
+            title="Title",
+            fetched_at=NOW,
+            changed_at=NOW,
+            next_fetch_at=next_fetch_at,
+        )
+    )
+    db.session.commit()
+
+
+def _urls():
+    return sorted(url for url, in db.session.query(ArticleRevision.url))
+
+
+def _deleted(reason):
+    return metrics._counters[("articles_deleted", (("reason", reason),))]
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    [
+        r"https://www\.derstandard\.at/story/\d+",
+        r"https://(?:www\.)?diepresse\.com/[0-9]+/",
+        r"https://kurier\.at/[^/]+/[\w-]+$",
+        r"https://orf\.at/stories/\d{7}/|https://wien\.orf\.at/stories/",
+    ],
+)
+def test_portable_regex(pattern):
+    assert cleanup._is_portable_regex(pattern)
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    [
+        # A backspace, a hexadecimal escape, a character class to Postgres
+        r"https://www\.derstandard\.at/story/\d+\b",
+        r"https://example\.com/\x41B",
+        r"https://example\.com/[[:digit:]]",
+        r"https://example\.com/{id}",
+        r"(?i)https://example\.com/",
+        r"https://example\.com/(?=story)",
+        r"https://example\.com/(?<!x)story",
+        r"https://example\.com/(\d+)/\1",
+        r"\Ahttps://example\.com/",
+        r"https://example\.com/(",
+    ],
+)
+def test_not_portable_regex(pattern):
+    assert not cleanup._is_portable_regex(pattern)
+
+
+def test_deletes_nonmatching_in_python():
+    matching = "https://www.derstandard.at/story/2000118"
+    _add_article(matching)
+    _add_article("https://www.derstandard.at/jetzt/livebericht/1")
+    _add_article("https://www.derstandard.at/story/2000118abc")
+    _add_article("https://www.derstandard.at/consent", next_fetch_at=NOT_DUE)
+    db.session.add(
+        UrlAlias(
+            url="https://derstandard.at/?1",
+            canonical_url="https://www.derstandard.at/jetzt/livebericht/1",
+        )
+    )
+    db.session.commit()
+
+    cleanup.delete_stale_articles(NOW)
+
+    assert _urls() == ["https://www.derstandard.at/consent", matching]
+    assert db.session.query(UrlAlias).count() == 0
+    assert _deleted("no_match") == 2
+
+
+def test_deletes_orphaned():
+    _add_article("https://www.derstandard.at/story/1")
+    _add_article("https://example.com/1", newspaper=None)
+    _add_article("https://example.com/2", newspaper=2)
+    _add_article("https://example.com/3", newspaper=2, next_fetch_at=NOT_DUE)
+
+    cleanup.delete_stale_articles(NOW)
+
+    assert _urls() == ["https://example.com/3", "https://www.derstandard.at/story/1"]
+    assert _deleted("orphaned") == 2
+
+
+@pytest.fixture
+def postgres(monkeypatch):
+    """
+    Pretend the database is Postgres, recording the patterns it would be told
+    to delete nonmatching rows by instead of deleting them.
+    """
+
+    monkeypatch.setattr(cleanup, "_is_postgres_regex", lambda pattern: True)
+
+    patterns = []
+    delete_batched = cleanup._delete_batched
+
+    def record(condition):
+        compiled = condition.compile(dialect=postgresql.dialect())
+        if "!~" not in str(compiled):
+            return delete_batched(condition)
+        patterns.extend(
+            value for value in compiled.params.values() if isinstance(value, str)
+        )
+        return 0
+
+    monkeypatch.setattr(cleanup, "_delete_batched", record)
+    return patterns
+
+
+def test_portable_pattern_matched_by_database(postgres):
+    newspaper = db.session.query(Newspaper).one()
+    newspaper.article_url_pattern = r"https://www\.derstandard\.at/story/\d+"
+    db.session.commit()
+    _add_article("https://www.derstandard.at/jetzt/livebericht/1")
+
+    cleanup.delete_stale_articles(NOW)
+
+    assert postgres == [r"^(?:https://www\.derstandard\.at/story/\d+)"]
+    # Left to the database
+    assert len(_urls()) == 1
+
+
+def test_other_pattern_matched_in_python(postgres):
+    _add_article("https://www.derstandard.at/story/2000118")
+    _add_article("https://www.derstandard.at/jetzt/livebericht/1")
+
+    cleanup.delete_stale_articles(NOW)
+
+    assert not postgres
+    assert _urls() == ["https://www.derstandard.at/story/2000118"]
@@ -0,0 +1,45 @@
+import time
+
+import pytest
+
+from medien_diff import app, debounce
+
+
+@pytest.fixture(autouse=True)
+def config(monkeypatch):
+    monkeypatch.setitem(app.config, "TWEET_DEBOUNCE_DAYS", 2)
+
+
+def test_claim():
+    change = (1, "https://example.com/a", "Old", "New")
+    assert debounce.seen([change, (1, "https://example.com/a", "New", "Old")]) == [
+        False,
+        False,
+    ]
+
+    assert debounce.claim(*change)
+    assert not debounce.claim(*change)
+    assert debounce.seen([change, (2, "https://example.com/a", "Old", "New")]) == [
+        True,
+        False,
+    ]
+
+    debounce.release(*change)
+    assert debounce.claim(*change)
+
+
+def test_forgotten_after_window(monkeypatch, redis_conn):
+    change = (1, "https://example.com/a", "Old", "New")
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now)
+    assert debounce.claim(*change)
+
+    (key,) = redis_conn.keys()
+    assert 2 * 24 * 60 * 60 < redis_conn.ttl(key) <= 3 * 24 * 60 * 60
+
+    monkeypatch.setattr(time, "time", lambda: now + 2 * 24 * 60 * 60)
+    assert debounce.seen([change]) == [True]
+
+    monkeypatch.setattr(time, "time", lambda: now + 3 * 24 * 60 * 60)
+    assert debounce.seen([change]) == [False]
+    assert debounce.claim(*change)
@@ -0,0 +1,78 @@
+import datetime
+
+import pytest
+
+from medien_diff import app, db
+from medien_diff.models import Newspaper, ArticleRevision
+from medien_diff.web import app as web_app
+
+T0 = datetime.datetime(2020, 7, 1)
+
+
+@pytest.fixture
+def client():
+    with app.app_context():
+        db.create_all()
+        db.session.add(Newspaper(id=1, name="Der Standard"))
+        db.session.add(Newspaper(id=2, name="Die Presse"))
+        for i in range(5):
+            db.session.add(
+                ArticleRevision(
+                    newspaper=1 + i % 2,
+                    url="https://example.com/{}".format(i),
+                    title="Headline 100% number {}".format(i),
+                    fetched_at=T0,
+                    # Two articles changed at the same time
+                    changed_at=T0 + datetime.timedelta(minutes=min(i, 3)),
+                )
+            )
+        db.session.commit()
+
+        yield web_app.test_client()
+
+        db.session.remove()
+        db.drop_all()
+
+
+def _urls(data):
+    return [change["url"][-1] for change in data["changes"]]
+
+
+def test_pagination(client):
+    data = client.get("/changes.json?limit=2").get_json()
+    assert data["estimated_count"] == 5
+    assert _urls(data) == ["4", "3"]
+    assert data["changes"][0]["newspaper"] == "Der Standard"
+
+    data = client.get(data["next"]).get_json()
+    assert _urls(data) == ["2", "1"]
+
+    data = client.get(data["next"]).get_json()
+    assert _urls(data) == ["0"]
+    assert data["next"] is None
+
+
+def test_filters(client):
+    data = client.get("/changes.json?newspaper=2").get_json()
+    assert _urls(data) == ["3", "1"]
+
+    data = client.get("/changes.json?q=100%25 NUMBER 3").get_json()
+    assert _urls(data) == ["3"]
+
+    data = client.get("/changes.json?q=1000").get_json()
+    assert data == {"estimated_count": 0, "next": None, "changes": []}
+
+
+def test_etag(client):
+    response = client.get("/changes.atom?newspaper=1")
+    assert response.mimetype == "application/atom+xml"
+    assert response.data.count(b"<entry>") == 3
+
+    response = client.get(
+        "/changes.atom?newspaper=1", headers={"If-None-Match": response.headers["ETag"]}
+    )
+    assert response.status_code == 304
+
+
+def test_bad_cursor(client):
+    assert client.get("/changes.json?before=nonsense").status_code == 400
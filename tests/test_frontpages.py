@@ -0,0 +1,82 @@
+import datetime
+
+from medien_diff import frontpages
+from medien_diff.schedule import SEEN_RESOLUTION
+
+
+def test_links_fingerprint():
+    fingerprint = frontpages.links_fingerprint
+
+    assert fingerprint({"a": None, "b": "B"}) == fingerprint({"b": "B", "a": None})
+    assert fingerprint({"a": None, "b": None}) != fingerprint({"ab": None})
+    assert fingerprint({"a": "A"}) != fingerprint({"a": "A2"})
+
+
+def test_store_and_load():
+    assert frontpages.load(1) == (None, None)
+
+    assert frontpages.store(1, "body1", {"a": None, "b": "B"})
+    assert frontpages.load(1) == ("body1", {"a": None, "b": "B"})
+
+    assert not frontpages.store(1, "body2", {"b": "B", "a": None})
+    assert frontpages.load(1) == ("body2", {"a": None, "b": "B"})
+
+    assert frontpages.store(1, "body3", {"a": None, "b": "B2"})
+    assert frontpages.load(1) == ("body3", {"a": None, "b": "B2"})
+
+
+def test_plan_due_at():
+    due_at = datetime.datetime(2020, 7, 5, 12, 30)
+    frontpages.store(1, "body1", {"a": None})
+    assert frontpages.plan_due_at(1) is None
+
+    frontpages.set_plan_due_at(1, due_at)
+    assert frontpages.plan_due_at(1) == due_at
+
+    # Same links
+    frontpages.store(1, "body2", {"a": None})
+    assert frontpages.plan_due_at(1) == due_at
+
+    frontpages.store(1, "body3", {"a": None, "b": None})
+    assert frontpages.plan_due_at(1) is None
+
+
+def test_plan_fetches():
+    now = datetime.datetime(2020, 7, 5)
+    due = now - datetime.timedelta(hours=1)
+    not_due = now + datetime.timedelta(hours=1)
+
+    links = {
+        "new": "Title",
+        "due": None,
+        "not_due": None,
+        "teaser_changed": "A completely different title",
+        "teaser_same": "Title",
+        "teaser_same_not_due": "Title",
+    }
+    rows = {
+        "due": ("Title", due),
+        "not_due": ("Title", not_due),
+        "teaser_changed": ("Title", not_due),
+        "teaser_same": ("Title", due),
+        "teaser_same_not_due": ("Title", not_due),
+    }
+
+    assert frontpages.plan_fetches(links, rows, now) == (
+        ["new", "due", "teaser_changed"],
+        ["teaser_same"],
+    )
+
+
+def test_next_plan_at():
+    now = datetime.datetime(2020, 7, 5)
+    soon = now + datetime.timedelta(minutes=10)
+    later = now + datetime.timedelta(days=1)
+    rows = {"a": ("Title", later), "b": ("Title", soon)}
+
+    assert frontpages.next_plan_at(rows, [], [], now) == soon
+    assert frontpages.next_plan_at({"a": ("Title", later)}, [], [], now) == (
+        now + SEEN_RESOLUTION
+    )
+    assert frontpages.next_plan_at(rows, ["c"], [], now) is None
+    assert frontpages.next_plan_at(rows, [], ["c"], now) is None
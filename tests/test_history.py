@@ -0,0 +1,67 @@
+import json
+import datetime
+
+import pytest
+
+from medien_diff import app, db, history, persistence
+from medien_diff.models import Title, TitleRevision
+
+T0 = datetime.datetime(2020, 6, 30)
+T1 = datetime.datetime(2020, 7, 2)
+
+
+@pytest.fixture(autouse=True)
+def database():
+    with app.app_context():
+        db.create_all()
+        yield
+        db.session.remove()
+        db.drop_all()
+
+
+def _write(url, title, fetched_at):
+    raw = json.dumps(
+        {
+            "newspaper_id": 1,
+            "url": url,
+            "final_url": url,
+            "title": title,
+            "fetched_at": fetched_at.isoformat(),
+            "delete": False,
+            "delete_if_no_change": False,
+        }
+    )
+    return persistence.write_results([raw])
+
+
+def test_titles_are_interned():
+    _write("a", "Same title", T0)
+    _write("b", "Same title", T0)
+    _write("a", "Same title.", T1)
+    _write("a", "Completely different", T1 + datetime.timedelta(hours=1))
+
+    assert db.session.query(Title).count() == 3
+    assert [
+        (r.url, r.seen_at, r.significant)
+        for r in db.session.query(TitleRevision).order_by(
+            TitleRevision.seen_at, TitleRevision.url
+        )
+    ] == [
+        ("a", T0, False),
+        ("b", T0, False),
+        ("a", T1, False),
+        ("a", T1 + datetime.timedelta(hours=1), True),
+    ]
+
+    assert history.change_counts(T1) == {1: (1, 1)}
+    assert history.change_counts(T0) == {1: (2, 1)}
+
+
+def test_drop_partitions():
+    _write("a", "Old title", T0)
+    _write("a", "Completely different", T1)
+
+    history.drop_partitions(T1)
+
+    assert [r.seen_at for r in db.session.query(TitleRevision)] == [T1]
+    assert [t.text for t in db.session.query(Title)] == ["Completely different"]
@@ -0,0 +1,53 @@
+import pytest
+
+from medien_diff.html_utils import incremental_matcher, stream_first_match, to_string
+
+_DOC = (
+    b"<html><head><title>Page</title></head><body>"
+    b'<div class="teaser"><h1 class="title">First <b>title</b></h1></div>'
+    b'<h1 class="title">Second title</h1>'
+    + b"<p>Lorem ipsum</p>" * 100
+    + b"</body></html>"
+)
+
+
+def _chunks(consumed, size=16):
+    for i in range(0, len(_DOC), size):
+        consumed.append(i)
+        yield _DOC[i : i + size]
+
+
+@pytest.mark.parametrize(
+    "selector,title",
+    [
+        (".title", "First title"),
+        ("div > h1", "First title"),
+        ("body > h1.title", "Second title"),
+        ("title, .title", "Page"),
+    ],
+)
+def test_stops_at_first_match(selector, title):
+    consumed = []
+    match = stream_first_match(_chunks(consumed), incremental_matcher(selector))
+
+    assert to_string(match) == title
+    assert len(consumed) * 16 < len(_DOC) / 2
+
+
+def test_no_match():
+    assert stream_first_match(_chunks([]), incremental_matcher(".missing")) is None
+
+
+@pytest.mark.parametrize(
+    "selector",
+    [
+        "h1:last-child",
+        "p:nth-last-child(2)",
+        "h1:only-child",
+        "h1:only-of-type",
+        "h1::text",
+        "h1[",
+    ],
+)
+def test_not_incremental(selector):
+    assert incremental_matcher(selector) is None
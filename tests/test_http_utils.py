@@ -0,0 +1,107 @@
+import time
+
+import pytest
+
+from medien_diff import app, http_utils
+
+URL = "https://example.com/"
+
+
+def test_revalidates_with_stored_validators(http_session):
+    http_session.pages[URL] = (200, {}, b"")
+    http_utils.conditional_get(URL)
+    assert http_session.requests[-1] == (URL, {})
+
+    http_utils.store_validators(
+        URL,
+        http_session.make_response(
+            URL, 200, headers={"ETag": '"abc"', "Last-Modified": "Wed, 01 Jul 2020"}
+        ),
+    )
+    http_session.pages[URL] = (304, {}, b"")
+    assert http_utils.conditional_get(URL).status_code == 304
+    assert http_session.requests[-1] == (
+        URL,
+        {"If-None-Match": '"abc"', "If-Modified-Since": "Wed, 01 Jul 2020"},
+    )
+
+
+def test_forget_and_replace_validators(http_session):
+    http_session.pages[URL] = (200, {}, b"")
+
+    http_utils.store_validators(
+        URL, http_session.make_response(URL, 200, headers={"ETag": "a"})
+    )
+    http_utils.forget_validators(URL)
+    http_utils.conditional_get(URL)
+    assert http_session.requests[-1] == (URL, {})
+
+    # A response without validators replaces the old ones
+    http_utils.store_validators(
+        URL, http_session.make_response(URL, 200, headers={"ETag": "a"})
+    )
+    http_utils.store_validators(URL, http_session.make_response(URL, 200))
+    http_utils.conditional_get(URL)
+    assert http_session.requests[-1] == (URL, {})
+
+
+def test_no_revalidation(http_session):
+    http_session.pages[URL] = (200, {}, b"")
+
+    http_utils.store_validators(
+        URL, http_session.make_response(URL, 200, headers={"ETag": "a"})
+    )
+    http_utils.conditional_get(URL, revalidate=False)
+    assert http_session.requests[-1] == (URL, {})
+
+
+def test_timeout(http_session):
+    http_session.pages[URL] = (200, {}, b"")
+
+    http_utils.conditional_get(URL)
+    assert http_session.kwargs["timeout"] == (
+        app.config["HTTP_CONNECT_TIMEOUT"],
+        app.config["HTTP_READ_TIMEOUT"],
+    )
+
+    http_utils.conditional_get(URL, timeout=1)
+    assert http_session.kwargs["timeout"] == 1
+
+
+@pytest.fixture
+def waits(monkeypatch):
+    """
+    Freeze the clock, recording how long `throttle` waits.
+    """
+
+    waits = []
+    monkeypatch.setattr(time, "time", lambda: 1000.0)
+    monkeypatch.setattr(time, "sleep", waits.append)
+    return waits
+
+
+def test_throttle_adds_up_waits(waits):
+    for path in "a", "b", "c", "d":
+        http_utils.throttle(URL + path, 2)
+
+    # A burst of one second's worth, then one request per half second
+    assert waits == [0.5, 1.0]
+
+
+def test_throttle_per_host(waits):
+    http_utils.throttle(URL, 1)
+    http_utils.throttle("https://example.org/", 1)
+    assert not waits
+
+    http_utils.throttle(URL, 1)
+    assert waits == [1.0]
+
+
+def test_conditional_get_throttles(http_session, waits):
+    http_session.pages[URL] = (200, {}, b"")
+
+    for _ in range(2):
+        http_utils.conditional_get(URL, max_requests_per_second=0.5)
+    http_utils.conditional_get(URL)
+
+    assert waits == [2.0]
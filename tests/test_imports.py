@@ -0,0 +1,26 @@
+import subprocess
+import sys
+
+# Only needed by the web app or when tweeting, workers shouldn't pay for them
+HEAVY_MODULES = {
+    "selenium",
+    "tweepy",
+    "flask_admin",
+    "flask_migrate",
+    "rq_dashboard",
+    "PIL",
+}
+
+
+def test_worker_does_not_import_heavy_modules():
+    output = subprocess.check_output(
+        [
+            sys.executable,
+            "-c",
+            "import sys, medien_diff.worker; print(' '.join(sys.modules))",
+        ]
+    )
+    modules = {name.split(".")[0] for name in output.decode("utf8").split()}
+
+    assert "medien_diff.tasks" in output.decode("utf8").split()
+    assert not modules & HEAVY_MODULES
@@ -0,0 +1,22 @@
+from medien_diff import inflight
+
+
+def test_claim_deduplicates():
+    assert inflight.claim([(1, "a"), (1, "b"), (1, "a"), (2, "a")]) == [
+        (1, "a"),
+        (1, "b"),
+        (2, "a"),
+    ]
+    assert inflight.claim([(1, "a"), (1, "c")]) == [(1, "c")]
+
+
+def test_release():
+    assert inflight.claim([(1, "a")]) == [(1, "a")]
+    inflight.release(1, "a")
+    assert inflight.claim([(1, "a")]) == [(1, "a")]
+
+
+def test_claims_expire(redis_conn):
+    inflight.claim([(1, "a")])
+    (key,) = redis_conn.keys()
+    assert 0 < redis_conn.ttl(key) <= inflight.INFLIGHT_TTL
@@ -0,0 +1,46 @@
+import pytest
+import rq
+
+from medien_diff import metrics, persistence
+
+
+@pytest.fixture(autouse=True)
+def queues(monkeypatch, redis_conn):
+    monkeypatch.setattr(
+        metrics,
+        "ALL_QUEUES",
+        {"main": rq.Queue("medien_diff_main", connection=redis_conn)},
+    )
+
+
+def test_render():
+    metrics.incr("http_responses", kind="article", status=304)
+    metrics.incr("http_responses", 2, kind="article", status=304)
+    metrics.observe("parse_seconds", 0.02, kind="article")
+    metrics.observe("parse_seconds", 120, kind="article")
+    metrics.flush()
+    metrics.incr("http_responses", kind="article", status=200)
+    metrics.flush()
+
+    lines = metrics.render().splitlines()
+
+    assert lines[:3] == [
+        "# TYPE medien_diff_http_responses_total counter",
+        'medien_diff_http_responses_total{kind="article",status="200"} 1.0',
+        'medien_diff_http_responses_total{kind="article",status="304"} 3.0',
+    ]
+    assert lines[3] == "# TYPE medien_diff_parse_seconds histogram"
+    assert 'medien_diff_parse_seconds_bucket{kind="article",le="0.01"} 0.0' not in lines
+    assert 'medien_diff_parse_seconds_bucket{kind="article",le="0.025"} 1.0' in lines
+    assert 'medien_diff_parse_seconds_bucket{kind="article",le="60"} 1.0' in lines
+    assert 'medien_diff_parse_seconds_bucket{kind="article",le="+Inf"} 2.0' in lines
+    assert 'medien_diff_parse_seconds_count{kind="article"} 2.0' in lines
+    assert 'medien_diff_parse_seconds_sum{kind="article"} 120.02' in lines
+    assert 'medien_diff_queue_jobs{queue="main"} 0' in lines
+    assert "medien_diff_pending_article_results 0" in lines
+    assert "medien_diff_failed_article_results 0" in lines
+
+
+def test_flush_without_metrics(redis_conn):
+    metrics.flush()
+    assert not redis_conn.keys()
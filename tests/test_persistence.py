@@ -0,0 +1,109 @@
+import datetime
+
+from medien_diff.persistence import merge_results
+from medien_diff.schedule import next_fetch_at
+
+T0 = datetime.datetime(2020, 7, 1)
+T1 = datetime.datetime(2020, 7, 2)
+
+
+def _row(url, title, at=T0):
+    return {
+        "newspaper": 1,
+        "url": url,
+        "title": title,
+        "fetched_at": at,
+        "changed_at": at,
+    }
+
+
+def _upserted(url, title, fetched_at=T1, changed_at=T0):
+    return dict(
+        _row(url, title),
+        fetched_at=fetched_at,
+        changed_at=changed_at,
+        next_fetch_at=next_fetch_at(fetched_at, changed_at),
+    )
+
+
+def _result(url, title, final_url=None, **kwargs):
+    result = {
+        "newspaper_id": 1,
+        "url": url,
+        "final_url": final_url or url,
+        "title": title,
+        "fetched_at": T1,
+        "delete": False,
+        "delete_if_no_change": False,
+    }
+    result.update(kwargs)
+    return result
+
+
+def test_new_and_changed():
+    rows = {"a": _row("a", "Old title")}
+    upserts, deletes, changes, lost, revisions = merge_results(
+        rows, [_result("a", "Completely new title"), _result("b", "Other")]
+    )
+
+    assert upserts == {
+        "a": _upserted("a", "Completely new title", changed_at=T1),
+        "b": _upserted("b", "Other", changed_at=T1),
+    }
+    assert not deletes
+    assert changes == [(1, "a", "Old title", "Completely new title")]
+    assert not lost
+    assert [(r["url"], r["title"], r["significant"]) for r in revisions] == [
+        ("a", "Completely new title", True),
+        ("b", "Other", False),
+    ]
+
+
+def test_not_modified():
+    rows = {"a": _row("a", "Old title")}
+    upserts, deletes, changes, lost, revisions = merge_results(
+        rows, [_result("a", None), _result("b", None)]
+    )
+
+    assert upserts == {"a": _upserted("a", "Old title")}
+    assert not changes
+    assert lost == ["b"]
+    assert not revisions
+
+
+def test_redirect_moves_row():
+    rows = {"a": _row("a", "Old title")}
+    upserts, deletes, changes, lost, revisions = merge_results(
+        rows, [_result("a", "Old title", final_url="https://a")]
+    )
+
+    assert upserts == {"https://a": _upserted("https://a", "Old title")}
+    assert deletes == {"a"}
+
+
+def test_redirect_to_existing_row():
+    rows = {"a": _row("a", "Old title"), "https://a": _row("https://a", "Old title")}
+    upserts, deletes, changes, lost, revisions = merge_results(
+        rows, [_result("a", "Old title", final_url="https://a")]
+    )
+
+    assert list(upserts) == ["https://a"]
+    assert deletes == {"a"}
+
+
+def test_deletes():
+    rows = {"a": _row("a", "Old title"), "b": _row("b", "Old title")}
+    upserts, deletes, changes, lost, revisions = merge_results(
+        rows,
+        [
+            _result("a", "Old title.", delete_if_no_change=True),
+            _result("b", None, delete=True),
+        ],
+    )
+
+    assert not upserts
+    assert deletes == {"a", "b"}
+    # The insignificant change is still logged
+    assert [(r["url"], r["title"], r["significant"]) for r in revisions] == [
+        ("a", "Old title.", False)
+    ]
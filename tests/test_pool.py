@@ -0,0 +1,98 @@
+import os
+import types
+
+import pytest
+
+from medien_diff import app, pool
+
+
+class FileQueue(object):
+    """
+    A queue whose jobs are lines in a file, so that forked workers and the
+    pool see the same jobs.
+    """
+
+    def __init__(self, path):
+        self.name = os.path.basename(path)
+        self.path = path
+
+    def jobs(self):
+        with open(self.path) as f:
+            return f.read().split()
+
+    def set_jobs(self, jobs):
+        with open(self.path, "w") as f:
+            f.write("".join(job + "\n" for job in jobs))
+
+    @property
+    def count(self):
+        return len(self.jobs())
+
+
+@pytest.fixture
+def done(tmp_path, monkeypatch):
+    """
+    Run the pool's workers in-process, logging which jobs they did and
+    whether they quit their browsers.
+    """
+
+    done = tmp_path / "done"
+    done.touch()
+
+    def log(line):
+        with open(done, "a") as f:
+            f.write(line + "\n")
+
+    class Worker(object):
+        def __init__(self, queues, connection):
+            self.queues = queues
+
+        def work(self, burst):
+            assert burst
+            # One job per run, so that the pool has to start it again
+            for queue in self.queues:
+                jobs = queue.jobs()
+                if jobs:
+                    queue.set_jobs(jobs[1:])
+                    log(jobs[0])
+                    if jobs[0] == "crash":
+                        raise RuntimeError("crash")
+                    return
+
+    browser = types.ModuleType("medien_diff.browser")
+    browser.close_browser_pool = lambda: log("browsers closed")
+
+    monkeypatch.setattr(pool, "RoundRobinSimpleWorker", Worker)
+    monkeypatch.setitem(pool.sys.modules, "medien_diff.browser", browser)
+
+    # Like `flask refresh`
+    with app.app_context():
+        yield done
+
+
+def test_runs_until_queues_are_empty(tmp_path, done):
+    main = FileQueue(str(tmp_path / "main"))
+    twitter = FileQueue(str(tmp_path / "twitter"))
+    main.set_jobs(["a", "crash", "b"])
+    twitter.set_jobs(["tweet"])
+
+    assert pool.WorkerPool([[main], [twitter]]).run()
+
+    lines = done.read_text().split("\n")[:-1]
+    assert sorted(line for line in lines if line != "browsers closed") == [
+        "a",
+        "b",
+        "crash",
+        "tweet",
+    ]
+    # Each worker process quit its browsers, even after a crash
+    assert lines.count("browsers closed") == 4
+    assert main.count == twitter.count == 0
+
+
+def test_nothing_to_do(tmp_path, done):
+    main = FileQueue(str(tmp_path / "main"))
+    main.set_jobs([])
+
+    assert pool.WorkerPool([[main]]).run()
+    assert done.read_text() == ""
@@ -0,0 +1,84 @@
+import pytest
+import sqlalchemy.event
+
+from medien_diff import app, db, profiles
+from medien_diff.models import Newspaper
+
+
+@pytest.fixture(autouse=True)
+def database(monkeypatch):
+    monkeypatch.setattr(profiles, "_profiles", {})
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(
+            Newspaper(
+                id=1,
+                name="Der Standard",
+                base_url="https://www.derstandard.at/",
+                article_url_pattern=r"https://www\.derstandard\.at/story/",
+                article_title_css_selector="h1",
+            )
+        )
+        db.session.commit()
+
+        yield
+
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def queries():
+    queries = []
+
+    def record(conn, cursor, statement, *args):
+        queries.append(statement)
+
+    sqlalchemy.event.listen(db.engine, "before_cursor_execute", record)
+    yield queries
+    sqlalchemy.event.remove(db.engine, "before_cursor_execute", record)
+
+
+def _version():
+    return profiles.redis_conn.get(profiles._version_key(1))
+
+
+def test_cached(queries):
+    profile = profiles.get_profile(1)
+    assert profile.name == "Der Standard"
+    assert len(queries) == 1
+
+    assert profiles.get_profile(1) is profile
+    assert len(queries) == 1
+
+
+def test_reloaded_after_commit():
+    profiles.get_profile(1)
+    version = _version()
+
+    db.session.query(Newspaper).get(1).name = "derStandard.at"
+    db.session.commit()
+
+    assert _version() != version
+    assert profiles.get_profile(1).name == "derStandard.at"
+
+
+def test_kept_after_rollback(queries):
+    profile = profiles.get_profile(1)
+    version = _version()
+
+    db.session.query(Newspaper).get(1).name = "derStandard.at"
+    db.session.flush()
+    db.session.rollback()
+    # Nor does the next commit bump the version for it
+    db.session.commit()
+    del queries[:]
+
+    assert _version() == version
+    assert profiles.get_profile(1) is profile
+    assert not queries
+
+
+def test_missing():
+    assert profiles.get_profile(2) is None
@@ -0,0 +1,31 @@
+from medien_diff.render import layout_diff
+
+
+def _measure(word, bold):
+    return 10 * len(word) + int(bold)
+
+
+def test_runs_are_merged():
+    diff = [("=", ["aa", "bb"]), ("-", ["cc", "dd"]), ("+", ["ee"])]
+    (line,) = layout_diff(diff, _measure, space_width=5, max_width=1000)
+
+    assert line == [
+        (0, 45, "aa bb", "="),
+        (50, 45, "cc dd", "-"),
+        (100, 21, "ee", "+"),
+    ]
+
+
+def test_wrapping():
+    diff = [("=", ["aaaa", "bbbb", "cccc"]), ("+", ["dddddddddddd"])]
+    lines = layout_diff(diff, _measure, space_width=5, max_width=90)
+
+    assert lines == [
+        [(0, 85, "aaaa bbbb", "=")],
+        [(0, 40, "cccc", "=")],
+        [(0, 121, "dddddddddddd", "+")],
+    ]
+
+
+def test_empty():
+    assert layout_diff([], _measure, space_width=5, max_width=90) == []
@@ -0,0 +1,23 @@
+import datetime
+
+from medien_diff.schedule import next_fetch_at, MIN_INTERVAL, MAX_INTERVAL
+
+NOW = datetime.datetime(2020, 7, 5, 12)
+
+
+def test_just_changed():
+    assert next_fetch_at(NOW, NOW) == NOW + MIN_INTERVAL
+
+
+def test_backoff():
+    intervals = [
+        next_fetch_at(NOW, NOW - datetime.timedelta(hours=hours)) - NOW
+        for hours in (1, 4, 16, 64)
+    ]
+
+    assert intervals == sorted(intervals)
+    assert intervals[1] == datetime.timedelta(hours=1)
+
+
+def test_old_article():
+    assert next_fetch_at(NOW, NOW - datetime.timedelta(days=365)) == NOW + MAX_INTERVAL
@@ -0,0 +1,488 @@
+import datetime
+
+import pytest
+import requests
+import sqlalchemy.exc
+
+from medien_diff import app, db, profiles, frontpages, http_utils, persistence, circuit
+from medien_diff import debounce, tweets, inflight
+from medien_diff import tasks, QUEUES, SHARDS
+from medien_diff.models import Newspaper, ArticleRevision, UrlAlias
+from medien_diff.schedule import SEEN_RESOLUTION
+
+BASE_URL = "https://example.com/"
+ARTICLE_URL = "https://example.com/story/1"
+
+
+@pytest.fixture(autouse=True)
+def database(monkeypatch):
+    monkeypatch.setattr(profiles, "_profiles", {})
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(
+            Newspaper(
+                id=1,
+                name="Der Standard",
+                base_url=BASE_URL,
+                article_url_pattern="https://example.com/story/",
+                article_title_css_selector="h1",
+            )
+        )
+        db.session.commit()
+
+        yield
+
+        db.session.remove()
+        db.drop_all()
+
+
+def _has_validators(url):
+    return bool(http_utils.redis_conn.exists(http_utils._validators_key(url)))
+
+
+def _store_validators(http_session, url):
+    http_utils.store_validators(
+        url, http_session.make_response(url, 200, headers={"ETag": '"abc"'})
+    )
+
+
+def _enqueued_urls():
+    return [
+        url
+        for queue in SHARDS["main"]
+        for job in queue.get_jobs()
+        for url in job.kwargs.get("urls", [])
+    ]
+
+
+def test_frontpage_not_modified_without_links(http_session):
+    _store_validators(http_session, BASE_URL)
+    http_session.pages[BASE_URL] = (304, {}, b"")
+
+    tasks.fetch_newspaper_frontpage(1)
+
+    assert http_session.requests[-1][1] == {"If-None-Match": '"abc"'}
+    # Nothing to compare the next response against
+    assert not _has_validators(BASE_URL)
+    assert not _enqueued_urls()
+
+
+def test_frontpage_not_modified_uses_stored_links(http_session):
+    _store_validators(http_session, BASE_URL)
+    frontpages.store(1, "fingerprint", {ARTICLE_URL: None})
+    http_session.pages[BASE_URL] = (304, {}, b"")
+
+    tasks.fetch_newspaper_frontpage(1)
+
+    assert _has_validators(BASE_URL)
+    assert _enqueued_urls() == [ARTICLE_URL]
+
+
+def test_article_not_modified_without_row(http_session):
+    _store_validators(http_session, ARTICLE_URL)
+    http_session.pages[ARTICLE_URL] = (304, {}, b"")
+
+    tasks.fetch_newspaper_article(1, ARTICLE_URL)
+    assert _has_validators(ARTICLE_URL)
+
+    tasks.flush_article_results()
+
+    # Lost: fetched in full next time
+    assert not _has_validators(ARTICLE_URL)
+    assert db.session.query(ArticleRevision).count() == 0
+
+
+def test_article_not_modified_with_row(http_session):
+    fetched_at = datetime.datetime.now() - datetime.timedelta(days=1)
+    db.session.add(
+        ArticleRevision(
+            newspaper=1,
+            url=ARTICLE_URL,
+            title="Title",
+            fetched_at=fetched_at,
+            changed_at=fetched_at,
+        )
+    )
+    db.session.commit()
+    _store_validators(http_session, ARTICLE_URL)
+    http_session.pages[ARTICLE_URL] = (304, {}, b"")
+
+    tasks.fetch_newspaper_article(1, ARTICLE_URL)
+    tasks.flush_article_results()
+
+    assert _has_validators(ARTICLE_URL)
+    article = db.session.query(ArticleRevision).one()
+    assert article.title == "Title"
+    assert article.fetched_at > fetched_at
+    assert article.changed_at == fetched_at
+
+
+def _record(url, title="Title"):
+    tasks._record_article_result(
+        newspaper_id=1, url=url, title=title, fetched_at=datetime.datetime.now()
+    )
+
+
+def test_bad_result_is_set_aside(monkeypatch):
+    write_results = persistence.write_results
+
+    def fail_on_bad(raw_results):
+        if any(b"/bad" in raw for raw in raw_results):
+            raise ValueError("bad result")
+        return write_results(raw_results)
+
+    monkeypatch.setattr(persistence, "write_results", fail_on_bad)
+    reported = []
+    monkeypatch.setattr(
+        tasks.sentry_sdk, "capture_exception", lambda: reported.append(True)
+    )
+    for url in "/1", "/bad", "/2":
+        _record(BASE_URL + url)
+
+    assert tasks.flush_article_results() == 3
+    assert sorted(url for url, in db.session.query(ArticleRevision.url)) == [
+        BASE_URL + "/1",
+        BASE_URL + "/2",
+    ]
+    assert persistence.failed_results() == 1
+    assert persistence.pending_results() == 0
+    assert len(reported) == 1
+
+    monkeypatch.setattr(persistence, "write_results", write_results)
+    assert persistence.retry_failed_results() == 1
+    assert tasks.flush_article_results() == 1
+    assert db.session.query(ArticleRevision).count() == 3
+
+
+def test_unavailable_database_keeps_results(monkeypatch):
+    def unavailable(raw_results):
+        raise sqlalchemy.exc.OperationalError("INSERT", {}, Exception())
+
+    monkeypatch.setattr(persistence, "write_results", unavailable)
+    _record(BASE_URL + "/1")
+
+    with pytest.raises(sqlalchemy.exc.OperationalError):
+        tasks.flush_article_results()
+
+    assert persistence.pending_results() == 1
+    assert persistence.failed_results() == 0
+
+
+def test_leftover_results_are_flushed(monkeypatch):
+    monkeypatch.setitem(app.config, "ARTICLE_BATCH_SIZE", 2)
+    for i in range(5):
+        _record("{}/{}".format(BASE_URL, i))
+
+    scheduled = QUEUES["main"].scheduled_job_registry
+    queued = QUEUES["main"].count
+    scheduled_before = scheduled.count
+
+    # A full batch left, flushed right away
+    tasks.flush_article_results()
+    assert QUEUES["main"].count == queued + 1
+
+    # Only part of a batch left, flushed once it had time to fill up
+    tasks.flush_article_results()
+    assert QUEUES["main"].count == queued + 1
+    assert scheduled.count == scheduled_before + 1
+
+    tasks.flush_article_results()
+    assert persistence.pending_results() == 0
+    assert scheduled.count == scheduled_before + 1
+
+
+def _add_article(url, changed_at, seen_on_frontpage_at=None):
+    db.session.add(
+        ArticleRevision(
+            newspaper=1,
+            url=url,
+            title="Title",
+            fetched_at=changed_at,
+            changed_at=changed_at,
+            next_fetch_at=changed_at,
+            seen_on_frontpage_at=seen_on_frontpage_at,
+        )
+    )
+    db.session.commit()
+
+
+def test_frontpage_marks_articles_seen(http_session):
+    long_ago = datetime.datetime.now() - datetime.timedelta(days=30)
+    _add_article(ARTICLE_URL, long_ago, long_ago)
+    frontpages.store(1, "fingerprint", {ARTICLE_URL: None})
+    http_session.pages[BASE_URL] = (304, {}, b"")
+
+    tasks.fetch_newspaper_frontpage(1)
+
+    article = db.session.query(ArticleRevision).one()
+    assert article.seen_on_frontpage_at > long_ago + datetime.timedelta(days=29)
+
+
+def test_frontpage_not_planned_while_nothing_due(http_session, monkeypatch):
+    planned = []
+    plan_fetches = frontpages.plan_fetches
+
+    def record(links, rows, now):
+        planned.append(sorted(links))
+        return plan_fetches(links, rows, now)
+
+    monkeypatch.setattr(frontpages, "plan_fetches", record)
+    now = datetime.datetime.now()
+    _add_article(ARTICLE_URL, now)
+    db.session.query(ArticleRevision).update(
+        {"next_fetch_at": now + datetime.timedelta(days=1)}
+    )
+    db.session.commit()
+    page = b'<html><body><a href="/story/1">Title</a>{}</body></html>'
+    http_session.pages[BASE_URL] = (200, {}, page.replace(b"{}", b""))
+
+    tasks.fetch_newspaper_frontpage(1)
+    assert planned == [[ARTICLE_URL]]
+    # When the sighting has to be recorded again
+    assert now < frontpages.plan_due_at(1) < now + 2 * SEEN_RESOLUTION
+
+    # Same links, even if the page changed otherwise
+    http_session.pages[BASE_URL] = (200, {}, page.replace(b"{}", b"<p>Ad</p>"))
+    tasks.fetch_newspaper_frontpage(1)
+    assert len(planned) == 1
+
+    # Time to record the sighting again
+    frontpages.set_plan_due_at(1, now)
+    tasks.fetch_newspaper_frontpage(1)
+    assert len(planned) == 2
+
+    # New links
+    http_session.pages[BASE_URL] = (
+        200,
+        {},
+        page.replace(b"{}", b'<a href="/story/2">Other</a>'),
+    )
+    tasks.fetch_newspaper_frontpage(1)
+    assert planned[2] == [ARTICLE_URL, BASE_URL + "story/2"]
+    assert _enqueued_urls() == [BASE_URL + "story/2"]
+    assert frontpages.plan_due_at(1) is None
+
+
+def test_refresh_expires_articles_off_the_frontpage():
+    now = datetime.datetime.now()
+    long_ago = now - datetime.timedelta(days=30)
+    _add_article(ARTICLE_URL, long_ago, now - datetime.timedelta(hours=1))
+    _add_article(BASE_URL + "story/2", long_ago, now - datetime.timedelta(days=8))
+
+    tasks.refresh_all()
+
+    delete_if_no_change = {
+        url: job.kwargs.get("delete_if_no_change", False)
+        for queue in SHARDS["slow"]
+        for job in queue.get_jobs()
+        for url in job.kwargs["urls"]
+    }
+    # Unchanged for long, but still on the frontpage
+    assert delete_if_no_change == {
+        ARTICLE_URL: False,
+        BASE_URL + "story/2": True,
+    }
+
+
+def test_timeout_counts_as_failure(http_session, monkeypatch):
+    monkeypatch.setitem(app.config, "CIRCUIT_FAILURE_THRESHOLD", 2)
+    http_session.pages[ARTICLE_URL] = requests.Timeout()
+
+    for _ in range(2):
+        with pytest.raises(requests.Timeout):
+            tasks.fetch_newspaper_article(1, ARTICLE_URL)
+
+    assert not circuit.allow(1)
+
+
+_ARTICLE_HTML = b"<html><head><title>Page</title></head><body><h1>Title</h1>"
+
+
+@pytest.fixture
+def reported(monkeypatch):
+    reported = []
+    monkeypatch.setattr(
+        tasks.sentry_sdk.Hub,
+        "capture_exception",
+        lambda self: reported.append(True),
+    )
+    return reported
+
+
+def _fetch_batch(urls):
+    assert inflight.claim([(1, url) for url in urls])
+    tasks.fetch_newspaper_articles(1, urls)
+    # Released, so that they can be queued again
+    assert inflight.claim([(1, url) for url in urls]) == [(1, url) for url in urls]
+
+
+def test_fetch_batch(http_session, reported):
+    urls = [BASE_URL + "story/{}".format(i) for i in range(3)]
+    for url in urls:
+        http_session.pages[url] = (200, {}, _ARTICLE_HTML)
+    http_session.pages[urls[1]] = (500, {}, b"")
+
+    _fetch_batch(urls)
+
+    assert persistence.pending_results() == 2
+    assert len(reported) == 1
+
+
+def test_fetch_batch_all_failed(http_session, reported):
+    urls = [BASE_URL + "story/{}".format(i) for i in range(3)]
+    for url in urls:
+        http_session.pages[url] = (500, {}, b"")
+
+    with pytest.raises(tasks.MissingData):
+        _fetch_batch(urls)
+
+    assert inflight.claim([(1, url) for url in urls]) == [(1, url) for url in urls]
+    assert persistence.pending_results() == 0
+    assert len(reported) == 3
+
+
+def test_fetch_batch_circuit_open(http_session, reported, monkeypatch):
+    monkeypatch.setitem(app.config, "CIRCUIT_FAILURE_THRESHOLD", 1)
+    circuit.record_failure(1)
+
+    _fetch_batch([ARTICLE_URL])
+
+    assert not http_session.requests
+    assert persistence.pending_results() == 0
+    assert not reported
+
+
+ALIAS_URL = "https://example.com/story/1-old-slug"
+
+
+@pytest.mark.parametrize("via", ["redirect", "canonical"])
+def test_article_alias(http_session, via):
+    long_ago = datetime.datetime.now() - datetime.timedelta(days=1)
+    _add_article(ARTICLE_URL, long_ago)
+    html = _ARTICLE_HTML
+    if via == "redirect":
+        http_session.redirects[ALIAS_URL] = ARTICLE_URL
+    else:
+        html = html.replace(
+            b"</title>", b'</title><link rel="canonical" href="/story/1">'
+        )
+    http_session.pages[ALIAS_URL] = (200, {}, html)
+
+    tasks.fetch_newspaper_article(1, ALIAS_URL)
+    tasks.flush_article_results()
+
+    assert [(a.url, a.canonical_url) for a in db.session.query(UrlAlias)] == [
+        (ALIAS_URL, ARTICLE_URL)
+    ]
+    article = db.session.query(ArticleRevision).one()
+    assert article.url == ARTICLE_URL
+    assert article.fetched_at > long_ago
+
+
+def test_frontpage_resolves_aliases(http_session):
+    long_ago = datetime.datetime.now() - datetime.timedelta(days=1)
+    _add_article(ARTICLE_URL, long_ago)
+    db.session.add(UrlAlias(url=ALIAS_URL, canonical_url=ARTICLE_URL))
+    db.session.commit()
+    http_session.pages[BASE_URL] = (
+        200,
+        {},
+        b'<html><body><a href="/story/1-old-slug?ref=home">Title</a></body></html>',
+    )
+
+    tasks.fetch_newspaper_frontpage(1)
+
+    assert _enqueued_urls() == [ARTICLE_URL]
+
+
+@pytest.fixture
+def twitter(monkeypatch):
+    """
+    Give the newspaper a Twitter account, recording the tweets sent and the
+    budget taken instead.
+    """
+
+    newspaper = db.session.query(Newspaper).one()
+    newspaper.twitter_consumer_key = newspaper.twitter_consumer_secret = "key"
+    newspaper.twitter_access_token_key = "token"
+    newspaper.twitter_access_token_secret = "secret"
+    db.session.commit()
+
+    sent = []
+    budget = []
+    monkeypatch.setattr(tasks, "tweet", lambda *args: sent.append(args))
+    monkeypatch.setattr(tweets, "take_budget", lambda account: budget.append(account))
+    return sent, budget
+
+
+def _scheduled_tweets():
+    queue = QUEUES["twitter"]
+    return [
+        queue.fetch_job(job_id).kwargs
+        for job_id in queue.scheduled_job_registry.get_job_ids()
+    ]
+
+
+def test_tweet_pending(twitter):
+    sent, budget = twitter
+    tweets.add_change(1, ARTICLE_URL, "Old title", "Entirely new title")
+
+    tasks.tweet_pending(1, ARTICLE_URL)
+
+    assert sent == [(1, ARTICLE_URL, "Old title", "Entirely new title")]
+    assert budget == ["token"]
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        None,
+        # Reverted
+        ("Old title", "Old title"),
+        # Tweeted before
+        ("Old title", "Tweeted title"),
+    ],
+)
+def test_tweet_pending_without_tweet(twitter, change):
+    sent, budget = twitter
+    debounce.claim(1, ARTICLE_URL, "Old title", "Tweeted title")
+    if change:
+        tweets.add_change(1, ARTICLE_URL, *change)
+
+    tasks.tweet_pending(1, ARTICLE_URL)
+
+    assert not sent
+    assert not budget
+
+
+def test_failed_tweet_is_retried(twitter, monkeypatch):
+    def fail(*args):
+        raise RuntimeError("Twitter is down")
+
+    monkeypatch.setattr(tasks, "tweet", fail)
+    tweets.add_change(1, ARTICLE_URL, "Old title", "Entirely new title")
+
+    with pytest.raises(RuntimeError):
+        tasks.tweet_pending(1, ARTICLE_URL)
+
+    assert _scheduled_tweets() == [
+        {"newspaper_id": 1, "url": ARTICLE_URL, "attempt": 2}
+    ]
+    # Not a new change, which would schedule its own job
+    assert not tweets.add_change(1, ARTICLE_URL, "Entirely new title", "Newer")
+
+
+def test_failed_tweet_is_given_up(twitter, monkeypatch):
+    def fail(*args):
+        raise RuntimeError("Twitter is down")
+
+    monkeypatch.setattr(tasks, "tweet", fail)
+    tweets.add_change(1, ARTICLE_URL, "Old title", "Entirely new title")
+
+    with pytest.raises(RuntimeError):
+        tasks.tweet_pending(1, ARTICLE_URL, attempt=tasks._TWEET_ATTEMPTS)
+
+    assert not _scheduled_tweets()
+    # Later changes get tweeted again
+    assert tweets.add_change(1, ARTICLE_URL, "Entirely new title", "Newer")
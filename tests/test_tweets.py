@@ -0,0 +1,40 @@
+import time
+
+from medien_diff import app, tweets
+
+
+def test_coalesce_changes():
+    assert tweets.add_change(1, "a", "First", "Second")
+    assert not tweets.add_change(1, "a", "Second", "Third")
+    assert tweets.add_change(2, "a", "Other", "Änderung")
+
+    assert tweets.pop_change(1, "a") == ("First", "Third")
+    assert tweets.pop_change(1, "a") is None
+    assert tweets.pop_change(2, "a") == ("Other", "Änderung")
+
+
+def test_restore_change():
+    tweets.add_change(1, "a", "First", "Second")
+    change = tweets.pop_change(1, "a")
+
+    tweets.restore_change(1, "a", *change)
+    assert tweets.pop_change(1, "a") == ("First", "Second")
+
+    # A change that came in meanwhile is kept
+    tweets.add_change(1, "a", "Second", "Third")
+    tweets.restore_change(1, "a", *change)
+    assert tweets.pop_change(1, "a") == ("First", "Third")
+
+
+def test_take_budget(monkeypatch):
+    monkeypatch.setitem(app.config, "TWEET_RATE_LIMIT", 2)
+    monkeypatch.setitem(app.config, "TWEET_RATE_LIMIT_WINDOW", 100)
+    monkeypatch.setattr(time, "time", lambda: 1030.0)
+
+    assert tweets.take_budget("account") == 0
+    assert tweets.take_budget("account") == 0
+    assert tweets.take_budget("other") == 0
+    assert tweets.take_budget("account") == 70
+
+    monkeypatch.setattr(time, "time", lambda: 1100.0)
+    assert tweets.take_budget("account") == 0
@@ -0,0 +1,29 @@
+import rq
+
+from medien_diff import worker
+
+
+def test_shard_rotation(monkeypatch, redis_conn):
+    main, *queues = [
+        rq.Queue(name, connection=redis_conn)
+        for name in ("main", "main_0", "main_1", "slow_0", "slow_1", "slow_2")
+    ]
+    main_shards, slow_shards = queues[:2], queues[2:]
+    monkeypatch.setattr(worker, "SHARDS", {"main": main_shards, "slow": slow_shards})
+
+    w = worker.RoundRobinSimpleWorker([main] + queues, connection=redis_conn)
+
+    def order():
+        return [queue.name for queue in w._ordered_queues]
+
+    w.reorder_queues(main)
+    assert order() == ["main", "main_0", "main_1", "slow_0", "slow_1", "slow_2"]
+
+    w.reorder_queues(slow_shards[0])
+    assert order() == ["main", "main_0", "main_1", "slow_1", "slow_2", "slow_0"]
+
+    w.reorder_queues(main_shards[0])
+    assert order() == ["main", "main_1", "main_0", "slow_1", "slow_2", "slow_0"]
+
+    w.reorder_queues(slow_shards[2])
+    assert order() == ["main", "main_1", "main_0", "slow_0", "slow_1", "slow_2"]